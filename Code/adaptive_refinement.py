@@ -0,0 +1,278 @@
+import argparse
+import numpy as np
+from itertools import product
+from equilibrium_engine import PROFILES, equilibrium_mask
+from parameter_grid import PARAMS
+
+# Adaptive alternative to the uniform np.arange grids. The domain is covered by
+# coarse cells; a cell whose corners all have the same equilibrium set is kept
+# as a uniform region, a cell whose corners disagree is split in two along every
+# free axis (a 2^d-tree, d <= 4) until it is one target resolution wide. Only
+# cells straddling a region boundary get refined, so cost follows the area of
+# the boundaries rather than the volume of the grid. Neighbouring cells share
+# corners, so each batch evaluates every distinct corner once.
+#
+# The full 4D boundary is still ~N^3 cells, which is why the default resolution
+# is 0.01; at 0.001, fixing axes (low == high) or shrinking the box is the way
+# to look at it closely.
+#
+# Corners outside the constraints b_Cs > b_Ss, b_Cc > b_Sc are ignored when
+# deciding whether a cell is uniform. The constraint planes are known exactly,
+# so a cell they cut is clipped to the smallest box holding its lattice points
+# that satisfy the constraints; if the valid corners of both boxes and the
+# lattice points along the edges of its constraint face agree, it is kept as a
+# uniform region reaching up to the plane instead of being refined down to the
+# resolution along the whole plane. Checking the face catches regions running
+# thinly along b_Cc = b_Sc, which the box corners step over. Regions thinner
+# than the coarse cells can be missed elsewhere if no corner lands in them, as
+# with any grid.
+
+OUTSIDE = np.int32(1 << len(PROFILES))  # Mask of a corner that violates the constraints
+
+
+def _values(corners, free, fixed):
+    values = dict(fixed)
+    for axis, (p, low, resolution) in enumerate(free):
+        values[p] = low + corners[..., axis] * resolution
+    return values
+
+def _outside(values):
+    return (values['b_Cs'] <= values['b_Ss']) | (values['b_Cc'] <= values['b_Sc'])
+
+def _corner_masks(tau, corners, free, top, fixed):
+    # Masks at lattice corners (..., d), each distinct corner evaluated once;
+    # also returns the number of corners evaluated
+    dims = tuple(top + 1)
+    keys, inverse = np.unique(np.ravel_multi_index(tuple(np.moveaxis(corners, -1, 0)), dims), return_inverse=True)
+    values = _values(np.stack(np.unravel_index(keys, dims), axis=-1), free, fixed)
+    masks = equilibrium_mask(tau, *(values[p] for p in PARAMS)).astype(np.int32)
+    masks[_outside(values)] = OUTSIDE
+    return masks[inverse.reshape(corners.shape[:-1])], len(keys)
+
+def _largest_below(low, resolution, bound):
+    # Largest lattice coordinate c with low + c * resolution < bound
+    c = np.floor((bound - low) / resolution).astype(np.int64)
+    c = np.where(low + (c + 1) * resolution < bound, c + 1, c)
+    return np.where(low + c * resolution < bound, c, c - 1)
+
+def _smallest_above(low, resolution, bound):
+    # Smallest lattice coordinate c with low + c * resolution > bound
+    c = _largest_below(low, resolution, bound) + 1
+    return np.where(low + c * resolution > bound, c, c + 1)
+
+def _clip_to_constraints(lower, upper, free, fixed):
+    # Shrinks cell boxes [lower, upper] (lattice coordinates) to the smallest boxes
+    # holding all their lattice points that satisfy the constraints
+    lower, upper = lower.copy(), upper.copy()
+    axes = {p: axis for axis, (p, _, _) in enumerate(free)}
+    low_values, high_values = _values(lower, free, fixed), _values(upper, free, fixed)
+    for small, large in [('b_Ss', 'b_Cs'), ('b_Sc', 'b_Cc')]:
+        if small in axes:
+            _, low, resolution = free[axes[small]]
+            below = _largest_below(low, resolution, high_values[large])
+            upper[:, axes[small]] = np.minimum(upper[:, axes[small]], below)
+        if large in axes:
+            _, low, resolution = free[axes[large]]
+            above = _smallest_above(low, resolution, low_values[small])
+            lower[:, axes[large]] = np.maximum(lower[:, axes[large]], above)
+    return lower, upper
+
+def _face_points(lower, upper, free, fixed):
+    # Lattice points on the constraint faces of clipped boxes [lower, upper], (n, m, d).
+    # A plane b_large = b_small with both axes free crosses the box as a staircase
+    # of lattice points; each staircase is laid out at every vertex of the valid
+    # part of the box in the other axes, i.e. along the edges of the face.
+    axes = {p: axis for axis, (p, _, _) in enumerate(free)}
+    pairs = [(axes[small], axes[large]) for small, large in [('b_Ss', 'b_Cs'), ('b_Sc', 'b_Cc')]
+             if small in axes and large in axes]
+    n, d = lower.shape
+    # Vertices of the valid region of each axis pair or single axis, as (n, k, d)
+    # arrays holding only their own axes
+    vertices = []
+    for s, l in pairs:
+        points = np.zeros((n, 6, d), dtype=np.int64)
+        for i, (a, b) in enumerate(product([lower, upper], repeat=2)):
+            points[:, i, s], points[:, i, l] = a[:, s], b[:, l]
+        # Where the staircase meets the lower b_large side and the upper b_large side
+        _, low_s, resolution = free[s]
+        _, low_l, _ = free[l]
+        points[:, 4, s] = lower[:, s]
+        points[:, 4, l] = np.clip(_smallest_above(low_l, resolution, low_s + lower[:, s] * resolution), lower[:, l], upper[:, l])
+        points[:, 5, s] = np.clip(_largest_below(low_s, resolution, low_l + upper[:, l] * resolution), lower[:, s], upper[:, s])
+        points[:, 5, l] = upper[:, l]
+        vertices.append(points)
+    paired = {axis for pair in pairs for axis in pair}
+    for axis in range(d):
+        if axis not in paired:
+            points = np.zeros((n, 2, d), dtype=np.int64)
+            points[:, 0, axis], points[:, 1, axis] = lower[:, axis], upper[:, axis]
+            vertices.append(points)
+
+    faces = []
+    for p, (s, l) in enumerate(pairs):
+        # Staircase: each b_small coordinate with the smallest b_large above it
+        _, low_s, resolution = free[s]
+        _, low_l, _ = free[l]
+        steps = np.arange(int((upper[:, s] - lower[:, s]).max(initial=0)) + 1)
+        stair = np.zeros((n, len(steps), d), dtype=np.int64)
+        stair[..., s] = np.minimum(lower[:, s, None] + steps, upper[:, s, None])
+        stair[..., l] = np.clip(_smallest_above(low_l, resolution, low_s + stair[..., s] * resolution),
+                                lower[:, l, None], upper[:, l, None])
+        face = stair
+        for q, points in enumerate(vertices):
+            if q != p:
+                face = (face[:, :, None, :] + points[:, None, :, :]).reshape(n, -1, d)
+        faces.append(face)
+    return np.concatenate(faces, axis=1) if faces else np.empty((n, 0, d), dtype=np.int64)
+
+def adaptive_sweep(tau, resolution=0.01, bounds=None, coarse_step=0.08, batch_size=20_000, counts=None):
+    # Yields blocks (kind, lower, size, corners, masks), kind 'uniform' or 'boundary',
+    # for cells given by their lower lattice corner and width (in units of resolution).
+    # Uniform cells cut by a constraint plane come with the corners of their
+    # clipped box. bounds maps a parameter to (low, high); low == high fixes it.
+    # counts, if given, collects the number of corner 'evaluations'.
+    bounds = {p: (0.01, 0.99) for p in PARAMS} | (bounds or {})
+    free = [(p, low, resolution) for p, (low, high) in bounds.items() if high > low]
+    fixed = {p: low for p, (low, high) in bounds.items() if high == low}
+    top = np.array([round((bounds[p][1] - low) / resolution) for p, low, _ in free])
+    offsets = np.array(list(product([0, 1], repeat=len(free))), dtype=np.int64)
+    counts = {} if counts is None else counts
+    counts.setdefault('evaluations', 0)
+
+    size = 1 << max(0, int(np.ceil(np.log2(coarse_step / resolution))))
+    roots = np.stack(np.meshgrid(*(np.arange(0, n, size) for n in top), indexing='ij'), axis=-1)
+    stack = [(roots.reshape(-1, len(free)), size)]
+    while stack:
+        cells, size = stack.pop()
+        if len(cells) > batch_size:
+            stack.append((cells[batch_size:], size))
+            cells = cells[:batch_size]
+        corners = np.minimum(cells[:, None, :] + size * offsets[None], top)
+        masks, evaluated = _corner_masks(tau, corners, free, top, fixed)
+        counts['evaluations'] += evaluated
+
+        valid = masks != OUTSIDE
+        reference = np.where(valid, masks, -1).max(axis=1)
+        agree = np.where(valid, masks == reference[:, None], True).all(axis=1)
+        inside = valid.any(axis=1)
+
+        uniform = inside & agree & valid.all(axis=1)
+        if uniform.any():
+            yield 'uniform', cells[uniform], size, corners[uniform], masks[uniform]
+
+        # Cells cut by a constraint plane: the corners of the clipped box must agree too
+        # Regions thinner than the cell can run along the plane, so the points on
+        # the constraint face have to agree as well; a face holds ~size points per
+        # vertex, so these cells go in smaller chunks
+        cut = np.flatnonzero(inside & agree & ~uniform)
+        for start in range(0, len(cut), max(1, batch_size // (size + 1))):
+            chunk = cut[start:start + max(1, batch_size // (size + 1))]
+            lower, upper = _clip_to_constraints(cells[chunk], np.minimum(cells[chunk] + size, top), free, fixed)
+            clipped = lower[:, None, :] + (upper - lower)[:, None, :] * offsets[None]
+            clipped = np.concatenate([clipped, _face_points(lower, upper, free, fixed)], axis=1)
+            clipped_masks, evaluated = _corner_masks(tau, clipped, free, top, fixed)
+            counts['evaluations'] += evaluated
+            kept = np.where(clipped_masks != OUTSIDE, clipped_masks == reference[chunk][:, None], True).all(axis=1)
+            if kept.any():
+                yield 'uniform', cells[chunk[kept]], size, clipped[kept], clipped_masks[kept]
+            agree[chunk[~kept]] = False
+
+        split = inside & ~agree
+        if size == 1:
+            if split.any():
+                yield 'boundary', cells[split], size, corners[split], masks[split]
+        elif split.any():
+            children = (cells[split][:, None, :] + (size // 2) * offsets[None]).reshape(-1, len(free))
+            stack.append((children[(children < top).all(axis=1)], size // 2))
+
+def summarize_refinement(blocks, num_free):
+    # Per-profile extents over the evaluated corners, plus the boundary cells themselves
+    summary = {
+        'low': np.full((len(PROFILES), num_free), np.iinfo(np.int64).max),
+        'high': np.full((len(PROFILES), num_free), -1),
+        'uniform_cells': 0,
+        'boundary_lower': [],
+        'boundary_any': [],
+        'boundary_all': [],
+    }
+    for kind, lower, size, corners, masks in blocks:
+        valid = masks != OUTSIDE
+        # Extents per distinct mask first; a block only holds a few of them
+        order = np.argsort(masks[valid], kind='stable')
+        group_masks, points = masks[valid][order], corners[valid][order]
+        starts = np.flatnonzero(np.diff(group_masks, prepend=-1))
+        group_masks = group_masks[starts]
+        group_low, group_high = np.minimum.reduceat(points, starts), np.maximum.reduceat(points, starts)
+        for k in range(len(PROFILES)):
+            hits = (group_masks >> k) & 1 == 1
+            if hits.any():
+                np.minimum(summary['low'][k], group_low[hits].min(axis=0), out=summary['low'][k])
+                np.maximum(summary['high'][k], group_high[hits].max(axis=0), out=summary['high'][k])
+        if kind == 'uniform':
+            summary['uniform_cells'] += len(lower)
+        else:
+            summary['boundary_lower'].append(lower)
+            # Profiles that switch on or off inside the cell are in any but not in all
+            summary['boundary_any'].append(np.bitwise_or.reduce(np.where(valid, masks, 0), axis=1))
+            summary['boundary_all'].append(np.bitwise_and.reduce(np.where(valid, masks, 0xFFFF), axis=1))
+    for key in ['boundary_lower', 'boundary_any', 'boundary_all']:
+        summary[key] = np.concatenate(summary[key]) if summary[key] else np.empty((0,))
+    return summary
+
+
+def parse_bounds(specs):
+    # 'b_Ss=0.2' fixes a parameter, 'b_Ss=0.1:0.4' restricts it
+    bounds = {}
+    for spec in specs:
+        param, value = spec.split('=')
+        low, _, high = value.partition(':')
+        bounds[param] = (float(low), float(high or low))
+    return bounds
+
+def bounds_lower(lower, bounds, free, resolution):
+    lower = lower.reshape(-1, len(free))
+    return np.stack([bounds[p][0] + lower[:, axis] * resolution for axis, p in enumerate(free)], axis=-1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive refinement of equilibrium region boundaries")
+    parser.add_argument('--tau', type=float, default=0.001)
+    parser.add_argument('--resolution', type=float, default=0.01,
+                        help="Target cell width; below 0.01 restrict the box with --bounds")
+    parser.add_argument('--coarse-step', type=float, default=0.08)
+    parser.add_argument('--bounds', nargs='*', default=[], help="e.g. b_Ss=0.2 b_Sc=0.1:0.5")
+    parser.add_argument('--output', help="Save the boundary cells to this .npz file")
+    args = parser.parse_args()
+
+    bounds = {p: (0.01, 0.99) for p in PARAMS} | parse_bounds(args.bounds)
+    free = [p for p in PARAMS if bounds[p][1] > bounds[p][0]]
+    counts = {}
+    summary = summarize_refinement(adaptive_sweep(args.tau, args.resolution, bounds, args.coarse_step, counts=counts), len(free))
+
+    dense = np.prod([round((bounds[p][1] - bounds[p][0]) / args.resolution) + 1 for p in free])
+    print(f"Evaluated {counts['evaluations']} corners ({counts['evaluations'] / dense:.2%} of a dense grid)")
+    print(f"Uniform cells: {summary['uniform_cells']}, boundary cells: {len(summary['boundary_lower'])}")
+
+    print("Equilibrium Regions:")
+    for k, eq in enumerate(PROFILES):
+        if summary['high'][k, 0] < 0:
+            continue
+        print(f"\nEquilibrium: {eq}")
+        print("Parameter Ranges:")
+        for axis, p in enumerate(free):
+            low = bounds[p][0] + summary['low'][k, axis] * args.resolution
+            high = bounds[p][0] + summary['high'][k, axis] * args.resolution
+            print(f"  {p}: [{low:.4f}, {high:.4f}]")
+
+    if args.output:
+        np.savez_compressed(
+            args.output,
+            lower=bounds_lower(summary['boundary_lower'], bounds, free, args.resolution),
+            any_mask=summary['boundary_any'],
+            all_mask=summary['boundary_all'],
+            params=np.array(free),
+            resolution=args.resolution,
+        )
+        print(f"Boundary cells have been written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
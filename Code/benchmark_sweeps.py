@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import multiprocessing as mp
+from collections import defaultdict
+import numpy as np
+import equilibrium_engine
+from equilibrium_engine import ENGINES, find_saddle_points
+from equilibrium_sweep import empty_summary, merge_summaries, sweep_tasks, sweep_chunk
+from legacy_scripts import LEGACY, load_legacy
+from parameter_grid import grid_axis, constrained_indices, constrained_size
+
+# Throughput and memory of the sweep implementations on a fixed reduced grid.
+# The v1-v5 scripts hardcode their grids and output paths, so their functions
+# (F ... process_params) are loaded from the scripts and driven by a copy of
+# each main() loop minus the printing and CSV: v1/v2 nested loops (v1 stops at
+# its first (CC, SS)-payoff match), v3/v5 pool.map over the whole ParameterGrid,
+# v4 pool.map in batches of 10000. 'scalar' is find_saddle_points over the
+# constrained lattice; the ENGINES run through sweep_tasks like v6.
+#
+# Every (implementation, core count) is measured in a fresh process, and payoff
+# evaluations are counted in another one -- a single-process pass counting
+# calls of payoff() for v1-v5, class payoff values (class_payoff outputs) for
+# the rest -- so the driver stays small. That matters because Linux carries
+# ru_maxrss over fork and exec: a measured process would start from the
+# driver's high-water mark. It resets its own peak (VmHWM, via
+# /proc/self/clear_refs) before the run and reports VmHWM; without /proc it
+# falls back to ru_maxrss. Pool workers report ru_maxrss, which starts at the
+# measured process's size when they are forked.
+#
+#   python benchmark_sweeps.py --step 0.05 --cores 1 2 4 --output bench.json
+#   python benchmark_sweeps.py --compare old.json new.json
+#
+# --reuse times the engines in one process with and without copying points from
+# finished stores (equilibrium_store.reuse_masks) and checks both give the same
+# masks, e.g. a step-0.01 sweep against a store of the same grid:
+#
+#   python benchmark_sweeps.py --step 0.01 --reuse equilibria_tau_0.001_step_0.01
+
+SERIAL = ['v1', 'v2', 'scalar']
+IMPLEMENTATIONS = list(LEGACY) + ['scalar'] + sorted(ENGINES)
+
+
+_process_params = None
+
+def _init_worker(version):
+    global _process_params
+    _process_params = load_legacy(version)['process_params']
+
+def _call_process_params(params):
+    return _process_params(params)
+
+
+def run_v1(ns, tau, step, pool):
+    points = 0
+    for b_Ss in np.arange(0.01, 0.99, step):
+        for b_Cs in np.arange(b_Ss + step, 0.99, step):
+            for b_Sc in np.arange(0.01, 0.99, step):
+                for b_Cc in np.arange(b_Sc + step, 0.99, step):
+                    points += 1
+                    for eq in ns['find_equilibria'](tau, b_Ss, b_Sc, b_Cs, b_Cc):
+                        eq_payoff = ns['payoff'](eq, tau, b_Ss, b_Sc, b_Cs, b_Cc)
+                        if eq == ('CC', 'SS') or abs(eq_payoff - ns['payoff'](('CC', 'SS'), tau, b_Ss, b_Sc, b_Cs, b_Cc)) < 1e-6:
+                            return points
+    return points
+
+def run_v2(ns, tau, step, pool):
+    equilibria_data = defaultdict(lambda: {'count': 0, 'params': {'b_Ss': [], 'b_Sc': [], 'b_Cs': [], 'b_Cc': []}})
+    points = 0
+    for b_Ss in np.arange(0.01, 0.99, step):
+        for b_Cs in np.arange(b_Ss + step, 0.99, step):
+            for b_Sc in np.arange(0.01, 0.99, step):
+                for b_Cc in np.arange(b_Sc + step, 0.99, step):
+                    points += 1
+                    for eq in ns['find_equilibria'](tau, b_Ss, b_Sc, b_Cs, b_Cc):
+                        equilibria_data[eq]['count'] += 1
+                        for param, value in zip(['b_Ss', 'b_Sc', 'b_Cs', 'b_Cc'], [b_Ss, b_Sc, b_Cs, b_Cc]):
+                            equilibria_data[eq]['params'][param].append(value)
+    return points
+
+def _legacy_grid(version, tau, step):
+    from sklearn.model_selection import ParameterGrid
+    param_grid = {p: np.arange(0.01, 1.00, step) for p in ['b_Ss', 'b_Sc', 'b_Cs', 'b_Cc']}
+    if version != 'v3':  # v3 has tau = 0.001 built into process_params
+        param_grid = {'tau': [tau]} | param_grid
+    return list(ParameterGrid(param_grid))
+
+def _aggregate(results):
+    equilibria_data = defaultdict(lambda: {'count': 0, 'params': defaultdict(list)})
+    points = 0
+    for result in results:
+        if result is not None:
+            points += 1
+            for eq, *values in result:
+                equilibria_data[eq]['count'] += 1
+                for i, value in enumerate(values):
+                    equilibria_data[eq]['params'][i].append(value)
+    return points
+
+def run_pool_map(version, batch_size=None):
+    def run(ns, tau, step, pool):
+        grid = _legacy_grid(version, tau, step)
+        mapper = pool.map if pool else (lambda f, items: list(map(f, items)))
+        if batch_size is None:
+            return _aggregate(mapper(_call_process_params, grid))
+        return sum(_aggregate(mapper(_call_process_params, grid[i:i + batch_size])) for i in range(0, len(grid), batch_size))
+    return run
+
+def run_scalar(ns, tau, step, pool):
+    axis = grid_axis(step)
+    n = len(axis)
+    for i_Ss, i_Sc, i_Cs, i_Cc in zip(*constrained_indices(n, 0, constrained_size(n))):
+        find_saddle_points(tau, axis[i_Ss], axis[i_Sc], axis[i_Cs], axis[i_Cc])
+    return constrained_size(n)
+
+def run_engine(engine, chunk_size=100_000):
+    def run(ns, tau, step, pool):
+        summary = empty_summary()
+        tasks = sweep_tasks([tau], step, engine, chunk_size)
+        for _, _, chunk_summary, _, _ in (pool.imap(sweep_chunk, tasks) if pool else map(sweep_chunk, tasks)):
+            merge_summaries(summary, chunk_summary)
+        return int(summary['evaluated'].sum())
+    return run
+
+RUNNERS = {
+    'v1': run_v1,
+    'v2': run_v2,
+    'v3': run_pool_map('v3'),
+    'v4': run_pool_map('v4', batch_size=10000),
+    'v5': run_pool_map('v5'),
+    'scalar': run_scalar,
+} | {engine: run_engine(engine) for engine in ENGINES}
+
+
+def count_payoff_evaluations(implementation, tau, step):
+    # Untimed single-process pass with a counting payoff function
+    global _process_params
+    count = [0]
+    if implementation in LEGACY:
+        ns = load_legacy(implementation)
+        payoff = ns['payoff']
+        def counting_payoff(*args):
+            count[0] += 1
+            return payoff(*args)
+        ns['payoff'] = counting_payoff
+        _process_params = ns.get('process_params')
+        RUNNERS[implementation](ns, tau, step, None)
+        return count[0]
+    class_payoff = equilibrium_engine.class_payoff
+    def counting_class_payoff(*args):
+        result = class_payoff(*args)
+        count[0] += np.size(result)
+        return result
+    equilibrium_engine.class_payoff = counting_class_payoff
+    try:
+        RUNNERS[implementation](None, tau, step, None)
+    finally:
+        equilibrium_engine.class_payoff = class_payoff
+    return count[0]
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(implementation, tau, step, cores):
+    # One timed run in this process; pools are started (and warmed up) before the clock
+    _reset_peak_rss()
+    ns = load_legacy(implementation) if implementation in LEGACY else None
+    pool = None
+    if implementation not in SERIAL:
+        initializer, initargs = (_init_worker, (implementation,)) if ns else (None, ())
+        pool = mp.Pool(cores, initializer, initargs)
+        pool.map(abs, range(cores))
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    points = RUNNERS[implementation](ns, tau, step, pool)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    if pool:
+        pool.close()
+        pool.join()
+    return {
+        'points': points,
+        'wall_seconds': wall,
+        'parent_cpu_seconds': cpu,
+        'peak_rss_mb': _peak_rss_mb(),
+        'peak_worker_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+def _run_subprocess(mode, implementation, tau, step, cores=1):
+    command = [sys.executable, os.path.abspath(__file__), mode, implementation,
+               '--tau', str(tau), '--step', str(step), '--cores', str(cores)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def measure_in_subprocess(implementation, tau, step, cores):
+    return _run_subprocess('--measure', implementation, tau, step, cores)
+
+def count_in_subprocess(implementation, tau, step):
+    # The v3-v5 passes build the whole ParameterGrid; keep that out of the driver
+    return _run_subprocess('--count', implementation, tau, step)
+
+
+def time_reuse(engine, tau, step, reuse, chunk_size=1_000_000):
+    # Serial sweep through sweep_chunk; returns wall seconds, evaluated points and the masks
+    tasks = sweep_tasks([tau], step, engine, chunk_size, keep_masks=True, reuse=reuse)
+    start = time.perf_counter()
+    results = [sweep_chunk(task) for task in tasks]
+    wall = time.perf_counter() - start
+    return wall, sum(int(r[2]['evaluated'][0]) for r in results), np.concatenate([r[3] for r in results], axis=1)
+
+def compare_reuse(engines, tau, step, reuse):
+    for engine in engines:
+        fresh_wall, total, fresh = time_reuse(engine, tau, step, ())
+        reuse_wall, evaluated, reused = time_reuse(engine, tau, step, reuse)
+        if not (fresh == reused).all():
+            raise AssertionError(f"{engine}: reused masks differ from recomputed ones")
+        print(f"{engine:>10}: recompute {fresh_wall:.2f} s, reuse {reuse_wall:.2f} s "
+              f"({reuse_wall / fresh_wall:.2f}x), evaluated {evaluated} of {total} points")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(implementations, tau, step, core_counts, repeats=1):
+    results = []
+    for implementation in implementations:
+        evaluations = count_in_subprocess(implementation, tau, step)
+        counts = [1] if implementation in SERIAL else core_counts
+        base_wall = None
+        for cores in counts:
+            # Best of the repeats
+            runs = [measure_in_subprocess(implementation, tau, step, cores) for _ in range(repeats)]
+            run = min(runs, key=lambda r: r['wall_seconds'])
+            run['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+            run['peak_worker_rss_mb'] = max(r['peak_worker_rss_mb'] for r in runs)
+            base_wall = base_wall or run['wall_seconds']
+            results.append(run | {
+                'implementation': implementation,
+                'cores': cores,
+                'payoff_evaluations': evaluations,
+                'points_per_second': run['points'] / run['wall_seconds'],
+                'payoff_evaluations_per_second': evaluations / run['wall_seconds'],
+                'speedup': base_wall / run['wall_seconds'],
+            })
+            print(f"{implementation:>10} x{cores}: {results[-1]['points_per_second']:12.0f} points/s, "
+                  f"{results[-1]['payoff_evaluations_per_second']:12.0f} payoffs/s, "
+                  f"peak RSS {run['peak_rss_mb']:.0f} MB (workers {run['peak_worker_rss_mb']:.0f} MB), "
+                  f"speedup {results[-1]['speedup']:.2f}")
+    return {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': mp.cpu_count(),
+        'tau': tau,
+        'step': step,
+        'repeats': repeats,
+        'results': results,
+    }
+
+def compare(old_file, new_file):
+    # points/s of new relative to old, per implementation and core count
+    with open(old_file) as f:
+        old = {(r['implementation'], r['cores']): r for r in json.load(f)['results']}
+    with open(new_file) as f:
+        new = json.load(f)['results']
+    for r in new:
+        key = (r['implementation'], r['cores'])
+        if key in old:
+            ratio = r['points_per_second'] / old[key]['points_per_second']
+            print(f"{key[0]:>10} x{key[1]}: {ratio:.2f}x points/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sweep implementations on a reduced grid")
+    parser.add_argument('--implementations', nargs='+', choices=IMPLEMENTATIONS, default=IMPLEMENTATIONS)
+    parser.add_argument('--tau', type=float, default=0.001)
+    parser.add_argument('--step', type=float, default=0.05)
+    parser.add_argument('--cores', type=int, nargs='+', default=[1, max(1, mp.cpu_count()-4)])
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--output', help="JSON file for the results (default benchmark_<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files instead")
+    parser.add_argument('--reuse', nargs='+', metavar='STORE', help="Time the engines with and without reusing these finished stores instead")
+    parser.add_argument('--measure', choices=IMPLEMENTATIONS, help=argparse.SUPPRESS)
+    parser.add_argument('--count', choices=IMPLEMENTATIONS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.reuse:
+        compare_reuse([i for i in args.implementations if i in ENGINES], args.tau, args.step, args.reuse)
+        return
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.tau, args.step, args.cores[0])))
+        return
+    if args.count:
+        print(json.dumps(count_payoff_evaluations(args.count, args.tau, args.step)))
+        return
+
+    report = run_benchmarks(args.implementations, args.tau, args.step, sorted(set(args.cores)), args.repeats)
+    output = args.output or f"benchmark_{(report['commit'] or 'local')[:10]}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results have been written to '{output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import multiprocessing as mp
+import numpy as np
+from equilibrium_engine import STRATEGIES, PROFILE_CLASS, payoff_tables, table_class_values
+from equilibrium_sweep import empty_summary, summarize_masks, merge_summaries, tau_label
+from parameter_grid import PARAMS, grid_axis, constrained_size, constrained_indices, chunk_ranges
+
+# Profitable deviations from one target profile over the constrained lattice,
+# the deviation analysis of strategic_complexity_equilibrium-v1.py for any
+# profile and any set of taus. Per point and tau, a uint8 mask holds one bit per
+# deviation in deviations(profile) -- each player to each strategy other than
+# their own, six in all as in v1: player 1 to s gains if payoff((s, p2)) > payoff(target),
+# player 2 to s if payoff((p1, s)) < payoff(target). Class payoffs come from the
+# payoff_tables of the separable engine, so a chunk costs a few table lookups
+# and comparisons per point.
+#
+# The census reuses the sweep summary (equilibrium_sweep.py) with the rows of
+# census_row_names(profile) in place of profiles: the deviation bits, then "player 1 / player 2 / either
+# player has some profitable deviation". Rows get the number of points and the
+# bounding box of lattice indices where they hold; the target is an equilibrium
+# at the 'evaluated' points minus the 'Either player' ones.
+#
+#   python deviation_census.py --profile CC SS --tau 0.05 --step 0.01
+
+NUM_DEVIATIONS = 2 * (len(STRATEGIES) - 1)
+NUM_ROWS = NUM_DEVIATIONS + 3
+EITHER_ROW = NUM_ROWS - 1
+
+
+def deviations(profile):
+    # (player, strategy) for every strategy a player can switch to from profile
+    return [(player, strategy) for player, own in ((1, profile[0]), (2, profile[1]))
+            for strategy in STRATEGIES if strategy != own]
+
+def census_row_names(profile):
+    return [f'Player {player} to {strategy}' for player, strategy in deviations(profile)] + \
+           ['Player 1 (any)', 'Player 2 (any)', 'Either player']
+
+def deviation_masks(values, profile):
+    # values: the four class payoff arrays (table_class_values); returns uint8 masks
+    i, j = STRATEGIES.index(profile[0]), STRATEGIES.index(profile[1])
+    target = values[PROFILE_CLASS[i, j]]
+    masks = np.zeros(np.shape(target), dtype=np.uint8)
+    for k, (player, strategy) in enumerate(deviations(profile)):
+        s = STRATEGIES.index(strategy)
+        c = PROFILE_CLASS[s, j] if player == 1 else PROFILE_CLASS[i, s]
+        if c == PROFILE_CLASS[i, j]:
+            continue  # Same payoff class, never profitable
+        profitable = values[c] > target if player == 1 else values[c] < target
+        masks |= profitable.astype(np.uint8) << k
+    return masks
+
+def census_rows(masks):
+    # Deviation bits plus the "any" bits, as uint16; player 1's deviations come first
+    rows = masks.astype(np.uint16)
+    half = NUM_DEVIATIONS // 2
+    player_bits = {1: (1 << half) - 1, 2: ((1 << half) - 1) << half}
+    for player in (1, 2):
+        rows |= ((masks & player_bits[player]) != 0).astype(np.uint16) << (NUM_DEVIATIONS + player - 1)
+    rows |= (masks != 0).astype(np.uint16) << (NUM_DEVIATIONS + 2)
+    return rows
+
+def census_chunk(args):
+    taus, step, start, stop, profile, keep_masks = args
+    axis = grid_axis(step)
+    indices = constrained_indices(len(axis), start, stop)
+    tables = payoff_tables(np.asarray(taus), axis, axis, axis, axis)
+    masks = deviation_masks(table_class_values(tables, *indices), profile)
+    summary = summarize_masks(census_rows(masks), indices, NUM_ROWS)
+    summary['evaluated'][:] = stop - start
+    return start, stop, summary, masks if keep_masks else None
+
+def deviation_census(profile, taus, step, chunk_size=1_000_000, keep_masks=False, pool=None):
+    # Returns the census summary and, with keep_masks, the (n_tau, n_points) deviation masks
+    total = constrained_size(len(grid_axis(step)))
+    tasks = [(tuple(taus), step, start, stop, tuple(profile), keep_masks) for start, stop in chunk_ranges(total, chunk_size)]
+    summary = empty_summary(len(taus), NUM_ROWS)
+    masks = np.zeros((len(taus), total), dtype=np.uint8) if keep_masks else None
+    for start, stop, chunk_summary, chunk_masks in (pool.imap(census_chunk, tasks) if pool else map(census_chunk, tasks)):
+        merge_summaries(summary, chunk_summary)
+        if keep_masks:
+            masks[:, start:stop] = chunk_masks
+    return summary, masks
+
+
+def print_census(summary, profile, taus, step):
+    axis = grid_axis(step)
+    for t, tau in enumerate(taus):
+        equilibrium = summary['evaluated'][t] - summary['count'][t, EITHER_ROW]
+        print(f"Deviation analysis of {tuple(profile)} (tau={tau}):")
+        print(f"No profitable deviation (equilibrium): {equilibrium} of {summary['evaluated'][t]} points")
+        for k, row in enumerate(census_row_names(profile)):
+            print(f"{row}: {summary['count'][t, k]}")
+            if summary['count'][t, k]:
+                print('  ' + ', '.join(f"{param}: [{axis[summary['low'][t, k, p]]:.2f}, {axis[summary['high'][t, k, p]]:.2f}]"
+                                       for p, param in enumerate(PARAMS)))
+        print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and locate profitable deviations from a strategy profile")
+    parser.add_argument('--profile', nargs=2, default=['CC', 'SS'], choices=STRATEGIES, metavar=('P1', 'P2'))
+    parser.add_argument('--tau', type=float, nargs='+', default=[0.05])
+    parser.add_argument('--step', type=float, default=0.01)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--cores', type=int, default=max(1, mp.cpu_count()-4))
+    parser.add_argument('--output', help="Save the summary and per-point deviation masks to this .npz file")
+    args = parser.parse_args()
+
+    with mp.Pool(args.cores) as pool:
+        summary, masks = deviation_census(args.profile, args.tau, args.step, args.chunk_size, bool(args.output), pool)
+    print_census(summary, args.profile, args.tau, args.step)
+    if args.output:
+        np.savez_compressed(args.output, masks=masks, taus=np.array(args.tau), step=args.step,
+                            profile=np.array(args.profile), rows=np.array(census_row_names(args.profile)), **summary)
+        print(f"Deviation census of {tau_label(args.tau)} has been written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import numpy as np
+from itertools import product, combinations
+from operator import itemgetter
+from game_dynamics_batch import STRATEGIES, CLASS_ACTIONS, profile_classes
+
+# Vectorized version of payoff / is_equilibrium / find_equilibria from
+# strategic_complexity_equilibrium-v5-parallel.py. Every b_* argument may be a
+# NumPy array (tau too); results broadcast over them.
+
+# Bump when payoff(), the payoff classes or the equilibrium condition change;
+# cached sweep results (sweep_cache.py) are keyed on it
+PAYOFF_MODEL_VERSION = 1
+
+# Bit k of an equilibrium mask stands for PROFILES[k] (same order as find_equilibria)
+PROFILES = list(product(STRATEGIES, repeat=2))
+PROFILE_BITS = (1 << np.arange(len(PROFILES))).astype(np.uint16)
+
+# PROFILE_CLASS[i, j] = payoff class of (STRATEGIES[i], STRATEGIES[j]), read off
+# the cycle the profile's game dynamics end in (see game_dynamics_batch.py).
+# Classes are indexed like payoff()'s if/elif chain: Ss, Cc, Sc, Cs.
+PROFILE_CLASS = profile_classes(STRATEGIES)
+PAYOFF_CLASSES = [[profile for k, profile in enumerate(PROFILES) if PROFILE_CLASS.flat[k] == c]
+                  for c in range(len(CLASS_ACTIONS))]
+
+
+def class_payoff(tau, b, b_F):
+    # Same operation order as payoff(), so results are bit-identical to the scalar code
+    F = tau + (1 - tau) * b_F
+    return (tau + (1-tau)*(1-b)*F) / (tau + (1-tau)*(b+(1-b)*F))
+
+def class_payoffs(tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    # Shape (..., 4): one payoff per class, indexed like PAYOFF_CLASSES
+    return np.stack(np.broadcast_arrays(
+        class_payoff(tau, b_Ss, b_Ss),
+        class_payoff(tau, b_Cc, b_Cc),
+        class_payoff(tau, b_Sc, b_Cs),
+        class_payoff(tau, b_Cs, b_Sc),
+    ), axis=-1)
+
+def payoff_matrix(tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    # Shape (..., 4, 4): rows are player 1's strategy, columns player 2's
+    return class_payoffs(tau, b_Ss, b_Sc, b_Cs, b_Cc)[..., PROFILE_CLASS]
+
+def equilibrium_mask_from_matrix(payoffs):
+    # Player 1 (maximizer) must not gain by switching rows, player 2 (minimizer)
+    # must not gain by switching columns -- the checks in is_equilibrium
+    best_row = payoffs.max(axis=-2, keepdims=True)
+    best_col = payoffs.min(axis=-1, keepdims=True)
+    is_eq = (payoffs >= best_row) & (payoffs <= best_col)
+    is_eq = is_eq.reshape(is_eq.shape[:-2] + (len(PROFILES),))
+    return np.where(is_eq, PROFILE_BITS, 0).sum(axis=-1, dtype=np.uint16)
+
+def equilibrium_mask(tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    return equilibrium_mask_from_matrix(payoff_matrix(tau, b_Ss, b_Sc, b_Cs, b_Cc))
+
+def mask_to_profiles(mask):
+    mask = int(mask)
+    return [profile for k, profile in enumerate(PROFILES) if mask >> k & 1]
+
+def find_equilibria_batch(tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    # Per point, the same list find_equilibria returns
+    masks = np.asarray(equilibrium_mask(tau, b_Ss, b_Sc, b_Cs, b_Cc))
+    return [mask_to_profiles(mask) for mask in masks.ravel()]
+
+
+def grid_equilibrium_masks(tau, ss_axis, sc_axis, cs_axis, cc_axis):
+    # Masks over the outer product of the four axes, shape (n_Ss, n_Sc, n_Cs, n_Cc)
+    return equilibrium_mask(
+        tau,
+        np.asarray(ss_axis)[:, None, None, None],
+        np.asarray(sc_axis)[None, :, None, None],
+        np.asarray(cs_axis)[None, None, :, None],
+        np.asarray(cc_axis)[None, None, None, :],
+    )
+
+
+# Separable engine. The SS class depends only on b_Ss, the CC class only on
+# b_Cc and the two mixed classes only on (b_Sc, b_Cs), so per tau the payoffs
+# are two 1D and two 2D tables. Which profiles are equilibria depends only on
+# how the four class payoffs are ordered, so the grid is decided by comparing
+# the tables against each other and looking the ordering up in ORDER_LUT.
+
+CLASS_PAIRS = list(combinations(range(len(PAYOFF_CLASSES)), 2))
+
+def payoff_tables(tau, ss_axis, sc_axis, cs_axis, cc_axis):
+    # tau may be an array of taus; its shape is prepended to every table
+    ss_axis, sc_axis, cs_axis, cc_axis = map(np.asarray, (ss_axis, sc_axis, cs_axis, cc_axis))
+    b_Sc, b_Cs = np.meshgrid(sc_axis, cs_axis, indexing='ij')
+    tau_1d, tau_2d = np.asarray(tau)[..., None], np.asarray(tau)[..., None, None]
+    return (
+        class_payoff(tau_1d, ss_axis, ss_axis),  # (n_Ss,)
+        class_payoff(tau_1d, cc_axis, cc_axis),  # (n_Cc,)
+        class_payoff(tau_2d, b_Sc, b_Cs),        # (n_Sc, n_Cs)
+        class_payoff(tau_2d, b_Cs, b_Sc),        # (n_Sc, n_Cs)
+    )
+
+def _compare(a, b):
+    # 0 if a < b, 1 if a == b, 2 if a > b
+    return (a > b).astype(np.int16) - (a < b) + 1
+
+def _order_code(values):
+    code = 0
+    for k, (i, j) in enumerate(CLASS_PAIRS):
+        code = code + _compare(values[i], values[j]) * 3**k
+    return code
+
+def _build_order_lut():
+    # Every weak ordering of the four class payoffs appears among these rank vectors
+    lut = np.zeros(3**len(CLASS_PAIRS), dtype=np.uint16)
+    for ranks in product(range(len(PAYOFF_CLASSES)), repeat=len(PAYOFF_CLASSES)):
+        values = np.array(ranks, dtype=float)
+        lut[_order_code(values)] = equilibrium_mask_from_matrix(values[PROFILE_CLASS])
+    return lut
+
+ORDER_LUT = _build_order_lut()
+
+def separable_equilibrium_masks(tau, ss_axis, sc_axis, cs_axis, cc_axis):
+    # Same result as grid_equilibrium_masks with O(N^2) payoff evaluations (one tau)
+    SS, CC, SC, CS = payoff_tables(tau, ss_axis, sc_axis, cs_axis, cc_axis)
+    values = [
+        SS[:, None, None, None],
+        CC[None, None, None, :],
+        SC[None, :, :, None],
+        CS[None, :, :, None],
+    ]
+    return ORDER_LUT[_order_code(values)]
+
+def table_class_values(tables, i_Ss, i_Sc, i_Cs, i_Cc):
+    # The four class payoffs at scattered lattice points, looked up in payoff_tables(...) output
+    SS, CC, SC, CS = tables
+    return [SS[..., i_Ss], CC[..., i_Cc], SC[..., i_Sc, i_Cs], CS[..., i_Sc, i_Cs]]
+
+def table_equilibrium_masks(tables, i_Ss, i_Sc, i_Cs, i_Cc):
+    # Masks at scattered lattice points
+    return ORDER_LUT[_order_code(table_class_values(tables, i_Ss, i_Sc, i_Cs, i_Cc))]
+
+
+# Engines evaluate lattice points given as index arrays into a shared axis
+# (see parameter_grid.py) for a 1D array of taus at once, returning masks of
+# shape (n_tau, n_points)
+
+def vectorized_lattice_masks(taus, axis, i_Ss, i_Sc, i_Cs, i_Cc):
+    return equilibrium_mask(np.asarray(taus)[:, None], axis[i_Ss], axis[i_Sc], axis[i_Cs], axis[i_Cc])
+
+def separable_lattice_masks(taus, axis, i_Ss, i_Sc, i_Cs, i_Cc):
+    tables = payoff_tables(np.asarray(taus), axis, axis, axis, axis)
+    return table_equilibrium_masks(tables, i_Ss, i_Sc, i_Cs, i_Cc)
+
+ENGINES = {
+    'vectorized': vectorized_lattice_masks,
+    'separable': separable_lattice_masks,
+}
+
+def engine_payoff_evaluations(engine, n_taus, n_axis, n_points):
+    # Class payoff values one engine call computes
+    if engine == 'separable':
+        return n_taus * (2 * n_axis + 2 * n_axis**2)
+    return n_taus * len(PAYOFF_CLASSES) * n_points
+
+
+# Scalar path: one point at a time in plain Python, for code that works point by
+# point like find_equilibria. The four class payoffs are computed once and the
+# 4x4 matrix is read off them, instead of up to 144 payoff() calls per point.
+
+PROFILE_CLASS_ROWS = PROFILE_CLASS.tolist()
+_ROW_PAYOFFS = [itemgetter(*row) for row in PROFILE_CLASS_ROWS]
+_COL_PAYOFFS = [itemgetter(*col) for col in PROFILE_CLASS.T.tolist()]
+_CELLS = [(PROFILES[len(STRATEGIES)*i + j], i, j, c)
+          for i, row in enumerate(PROFILE_CLASS_ROWS) for j, c in enumerate(row)]
+
+def scalar_class_payoffs(tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    return (
+        class_payoff(tau, b_Ss, b_Ss),
+        class_payoff(tau, b_Cc, b_Cc),
+        class_payoff(tau, b_Sc, b_Cs),
+        class_payoff(tau, b_Cs, b_Sc),
+    )
+
+def scalar_payoff_matrix(tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    values = scalar_class_payoffs(tau, b_Ss, b_Sc, b_Cs, b_Cc)
+    return [list(row(values)) for row in _ROW_PAYOFFS]
+
+def undominated_strategies(matrix):
+    # Iterated elimination of strictly dominated strategies (player 1 maximizes,
+    # player 2 minimizes). Strict dominance never removes a saddle point, so the
+    # saddle points of the reduced game are exactly those of the full one.
+    rows, cols = list(range(len(matrix))), list(range(len(matrix[0])))
+    changed = True
+    while changed:
+        changed = False
+        for i in rows:
+            if any(all(matrix[k][j] > matrix[i][j] for j in cols) for k in rows if k != i):
+                rows.remove(i)
+                changed = True
+                break
+        for j in cols:
+            if any(all(matrix[i][l] < matrix[i][j] for i in rows) for l in cols if l != j):
+                cols.remove(j)
+                changed = True
+                break
+    return rows, cols
+
+def find_saddle_points(tau, b_Ss, b_Sc, b_Cs, b_Cc, prune=False):
+    # Same list as find_equilibria: profiles whose payoff is the maximum of its
+    # column (player 1's best response) and the minimum of its row (player 2's).
+    # prune first drops strictly dominated strategies; on the 4x4 game that
+    # costs more than it saves, so it is off by default.
+    values = scalar_class_payoffs(tau, b_Ss, b_Sc, b_Cs, b_Cc)
+    if prune:
+        matrix = [list(row(values)) for row in _ROW_PAYOFFS]
+        rows, cols = undominated_strategies(matrix)
+        best_row = {j: max(matrix[i][j] for i in rows) for j in cols}
+        best_col = {i: min(matrix[i][j] for j in cols) for i in rows}
+        return [profile for profile, i, j, c in _CELLS
+                if i in best_col and j in best_row and best_row[j] <= values[c] <= best_col[i]]
+    best_row = [max(col(values)) for col in _COL_PAYOFFS]
+    best_col = [min(row(values)) for row in _ROW_PAYOFFS]
+    return [profile for profile, i, j, c in _CELLS if best_row[j] <= values[c] <= best_col[i]]
@@ -0,0 +1,255 @@
+import argparse
+import csv
+import json
+import os
+import numpy as np
+from equilibrium_engine import PROFILES, STRATEGIES
+from equilibrium_store import open_store, store_axis, store_lattice
+from parameter_grid import PARAMS, LATTICE_SCALE, num_pairs, constrained_size, constrained_pairs, \
+    lattice_points, lattice_position, pair_position
+from adaptive_refinement import parse_bounds
+
+# Query index over a finished equilibrium store (equilibrium_store.py). For each
+# tau and profile it holds the sorted positions t of the constrained lattice
+# points (parameter_grid.py: pair t // P of (i_Ss, i_Cs), pair t % P of
+# (i_Sc, i_Cc)) where the profile is an equilibrium, all lists back to back in
+# one memory-mapped array; the JSON sidecar has where each list starts.
+#
+# Positions run in (i_Ss, i_Cs, i_Sc, i_Cc) order, so a box of parameter ranges
+# is a union of contiguous position ranges -- one per (i_Ss, i_Cs) pair and i_Sc
+# row, merged where they touch; a range on b_Ss alone is a single one. Counting
+# a box is two binary searches per range into the list, and fetching its points
+# reads only the matching entries, so queries touch a few pages of the file
+# instead of the whole store. Per-profile counts come from the sidecar.
+#
+#   python equilibrium_index.py equilibria_tau_0.001_step_0.01 --build
+#   python equilibrium_index.py equilibria_tau_0.001_step_0.01 --point 0.2 0.3 0.6 0.7
+#   python equilibrium_index.py equilibria_tau_0.001_step_0.01 --profile CS CS --where 'b_Ss<0.3'
+#
+# --where takes 'b_Ss<0.3', 'b_Cc>=0.5' or the --bounds form of
+# adaptive_refinement.py ('b_Sc=0.1:0.4', 'b_Ss=0.2'), all inclusive of lattice
+# points equal to the bound except < and >.
+
+OPERATORS = ['<=', '>=', '<', '>']
+
+
+def index_files(path):
+    return f'{path}_index.npy', f'{path}_index.json'
+
+def _slab_positions(stored, t, i, pairs):
+    # Masks of the lattice points with i_Ss == i, in position order, and the first position
+    n = stored.shape[1]
+    low, high = pairs
+    slab = np.asarray(stored[t, i, :, i + 1:, :])  # (i_Sc, i_Cs, i_Cc), read contiguously
+    return slab[low, :, high].T.ravel(), int(pair_position(n, i, i + 1)) * num_pairs(n)
+
+def build_index(path):
+    # Two passes over the store, one i_Ss slab at a time: count, then fill
+    stored, store_meta = open_store(path)
+    if not store_meta.get('complete'):
+        raise ValueError(f"Store '{path}' is from an unfinished sweep; index it once the sweep has finished")
+    num_taus, n = stored.shape[0], stored.shape[1]
+    pairs = constrained_pairs(n)
+    dtype = np.uint32 if constrained_size(n) <= np.iinfo(np.uint32).max else np.uint64
+
+    counts = np.zeros((num_taus, len(PROFILES)), dtype=np.int64)
+    for t in range(num_taus):
+        for i in range(n - 1):
+            masks, _ = _slab_positions(stored, t, i, pairs)
+            counts[t] += [np.count_nonzero((masks >> k) & 1) for k in range(len(PROFILES))]
+    offsets = np.concatenate([[0], np.cumsum(counts.ravel())])
+
+    index_file, meta_file = index_files(path)
+    points = np.lib.format.open_memmap(index_file, mode='w+', dtype=dtype, shape=(max(1, int(offsets[-1])),))
+    fill = offsets[:-1].reshape(num_taus, len(PROFILES)).copy()
+    for t in range(num_taus):
+        for i in range(n - 1):
+            masks, base = _slab_positions(stored, t, i, pairs)
+            for k in range(len(PROFILES)):
+                found = np.flatnonzero((masks >> k) & 1) + base
+                points[fill[t, k]:fill[t, k] + len(found)] = found
+                fill[t, k] += len(found)
+    points.flush()
+
+    meta = {key: store_meta[key] for key in ('taus', 'step', 'start', 'stop', 'lattice_scale',
+                                             'start_units', 'step_units', 'shape', 'profiles', 'constraints')}
+    meta |= {'store': path, 'dtype': np.dtype(dtype).name, 'offsets': offsets.tolist()}
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def open_index(path):
+    index_file, meta_file = index_files(path)
+    with open(meta_file) as f:
+        meta = json.load(f)
+    return np.load(index_file, mmap_mode='r'), meta
+
+
+def tau_position(meta, tau):
+    if tau not in meta['taus']:
+        raise ValueError(f"tau={tau} is not in the index (taus: {meta['taus']})")
+    return meta['taus'].index(tau)
+
+def profile_points(points, meta, t, k):
+    # Sorted lattice positions where PROFILES[k] is an equilibrium at the t-th tau (a view on disk)
+    start = t * len(PROFILES) + k
+    return points[meta['offsets'][start]:meta['offsets'][start + 1]]
+
+def profile_counts(meta):
+    # (n_tau, n_profiles) equilibrium points over the whole lattice, from the sidecar only
+    return np.diff(meta['offsets']).reshape(len(meta['taus']), len(PROFILES))
+
+def _lattice_index(meta, value):
+    # Axis index of a parameter value, -1 if the value is not on the grid
+    units = value * LATTICE_SCALE
+    if not np.isclose(units, round(units)):
+        return -1
+    matches = np.flatnonzero(store_lattice(meta) == round(units))
+    return int(matches[0]) if len(matches) else -1
+
+def point_profiles(points, meta, t, point):
+    # Equilibrium profiles at one (b_Ss, b_Sc, b_Cs, b_Cc) point of the grid
+    indices = [_lattice_index(meta, value) for value in point]
+    if min(indices) < 0:
+        raise ValueError(f"{tuple(point)} is not on the grid of step {meta['step']}")
+    if indices[2] <= indices[0] or indices[3] <= indices[1]:
+        raise ValueError(f"{tuple(point)} violates the constraints {', '.join(meta['constraints'])}")
+    position = lattice_position(meta['shape'][1], *indices)
+    profiles = []
+    for k, eq in enumerate(PROFILES):
+        found = profile_points(points, meta, t, k)
+        where = np.searchsorted(found, position.astype(found.dtype))
+        if where < len(found) and found[where] == position:
+            profiles.append(eq)
+    return profiles
+
+
+def box_bounds(meta, specs):
+    # Inclusive axis index bounds per parameter from --where specs
+    lattice = store_lattice(meta).astype(np.int64)
+    box = {p: (0, meta['shape'][1] - 1) for p in PARAMS}
+    for spec in specs:
+        operator = next((op for op in OPERATORS if op in spec), None)
+        if operator is None:
+            (param, (low, high)), = parse_bounds([spec]).items()
+            bounds = [('>=', low), ('<=', high)]
+        else:
+            param, value = spec.split(operator)
+            bounds = [(operator, float(value))]
+        if param not in PARAMS:
+            raise ValueError(f"Unknown parameter '{param}' in '{spec}' (one of {', '.join(PARAMS)})")
+        low, high = box[param]
+        for operator, value in bounds:
+            units = value * LATTICE_SCALE
+            units = round(units) if np.isclose(units, round(units)) else units
+            if operator in ('>', '>='):
+                inside = lattice > units if operator == '>' else lattice >= units
+                low = max(low, int(np.argmax(inside)) if inside.any() else meta['shape'][1])
+            else:
+                inside = lattice < units if operator == '<' else lattice <= units
+                high = min(high, int(np.flatnonzero(inside)[-1]) if inside.any() else -1)
+        box[param] = (low, high)
+    return box
+
+def _merge_ranges(lo, hi):
+    # Joins sorted [lo, hi) ranges that touch
+    if len(lo) == 0:
+        return lo, hi
+    opens = np.concatenate([[True], lo[1:] != hi[:-1]])
+    closes = np.concatenate([opens[1:], [True]])
+    return lo[opens], hi[closes]
+
+def _pair_ranges(n, low_bounds, high_bounds):
+    # Ranges of pair positions with i in low_bounds, j in high_bounds and i < j
+    i = np.arange(low_bounds[0], low_bounds[1] + 1, dtype=np.int64)
+    j = np.maximum(high_bounds[0], i + 1)
+    i, j = i[j <= high_bounds[1]], j[j <= high_bounds[1]]
+    return _merge_ranges(pair_position(n, i, j), pair_position(n, i, high_bounds[1]) + 1)
+
+def box_ranges(n, box):
+    # Sorted, disjoint [lo, hi) ranges of lattice positions inside the box
+    outer_lo, outer_hi = _pair_ranges(n, box['b_Ss'], box['b_Cs'])
+    inner_lo, inner_hi = _pair_ranges(n, box['b_Sc'], box['b_Cc'])
+    size = num_pairs(n)
+    if len(inner_lo) == 1 and inner_lo[0] == 0 and inner_hi[0] == size:
+        return outer_lo * size, outer_hi * size
+    outer = np.concatenate([np.arange(lo, hi) for lo, hi in zip(outer_lo, outer_hi)] or [np.zeros(0, np.int64)])
+    return _merge_ranges((outer[:, None] * size + inner_lo).ravel(), (outer[:, None] * size + inner_hi).ravel())
+
+def _range_positions(found, ranges):
+    # One search over the interleaved bounds; keys in the index dtype, or
+    # searchsorted would convert the whole list first
+    keys = np.column_stack(ranges).ravel().astype(found.dtype)
+    first, last = np.searchsorted(found, keys).reshape(-1, 2).T
+    return first, last
+
+def count_box(points, meta, t, k, ranges):
+    found = profile_points(points, meta, t, k)
+    first, last = _range_positions(found, ranges)
+    return int((last - first).sum())
+
+def query_box(points, meta, t, k, ranges, limit=None):
+    # (i_Ss, i_Sc, i_Cs, i_Cc) of the points in the ranges where PROFILES[k] is an
+    # equilibrium, in position order; only the first `limit` are read
+    found = profile_points(points, meta, t, k)
+    first, last = _range_positions(found, ranges)
+    ends = np.cumsum(last - first)
+    if limit is not None:
+        ends = np.minimum(ends, limit)
+    sizes = np.diff(ends, prepend=0)
+    entries = np.arange(ends[-1] if len(ends) else 0) + np.repeat(first - (ends - sizes), sizes)
+    return lattice_points(meta['shape'][1], found[entries])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Point lookups, box queries and counts over a finished equilibrium store")
+    parser.add_argument('store', help="Store path of the sweep, e.g. equilibria_tau_0.001_step_0.01")
+    parser.add_argument('--build', action='store_true', help="(Re)build the index; it is also built when missing")
+    parser.add_argument('--tau', type=float, nargs='+', help="Taus to query (default: all in the store)")
+    parser.add_argument('--point', type=float, nargs=4, metavar=tuple(PARAMS), help="Print the equilibria at this point")
+    parser.add_argument('--profile', nargs=2, choices=STRATEGIES, metavar=('P1', 'P2'), help="List the points of this equilibrium")
+    parser.add_argument('--where', nargs='*', default=[], help="e.g. 'b_Ss<0.3' 'b_Cc>=0.5' b_Sc=0.1:0.4")
+    parser.add_argument('--limit', type=int, default=20, help="Most points to print with --profile")
+    parser.add_argument('--output', help="Write all points of --profile in the box to this CSV file")
+    args = parser.parse_args()
+
+    if args.build or not os.path.exists(index_files(args.store)[1]):
+        build_index(args.store)
+        print(f"Query index has been written to '{index_files(args.store)[0]}'")
+    points, meta = open_index(args.store)
+    taus = args.tau or meta['taus']
+    axis = store_axis(meta)
+    box = box_bounds(meta, args.where)
+    ranges = box_ranges(meta['shape'][1], box)
+
+    for tau in taus:
+        t = tau_position(meta, tau)
+        if args.point:
+            profiles = point_profiles(points, meta, t, args.point)
+            print(f"Equilibria at {', '.join(f'{p}={v}' for p, v in zip(PARAMS, args.point))} (tau={tau}): "
+                  f"{', '.join(map(str, profiles)) or 'none'}")
+        elif args.profile:
+            k = PROFILES.index(tuple(args.profile))
+            print(f"{tuple(args.profile)} (tau={tau}): {count_box(points, meta, t, k, ranges)} points"
+                  + (f" with {' '.join(args.where)}" if args.where else ""))
+            for indices in zip(*query_box(points, meta, t, k, ranges, args.limit)):
+                print('  ' + ', '.join(f"{p}={float(axis[i])}" for p, i in zip(PARAMS, indices)))
+        else:
+            print(f"Equilibrium counts (tau={tau})" + (f" with {' '.join(args.where)}:" if args.where else ":"))
+            for k, eq in enumerate(PROFILES):
+                count = count_box(points, meta, t, k, ranges) if args.where else profile_counts(meta)[t, k]
+                if count:
+                    print(f"{eq}: {count}")
+
+    if args.output and args.profile:
+        k = PROFILES.index(tuple(args.profile))
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['tau'] + PARAMS)
+            for tau in taus:
+                indices = query_box(points, meta, tau_position(meta, tau), k, ranges)
+                writer.writerows([tau] + [str(float(axis[i])) for i in row] for row in zip(*indices))
+        print(f"Points of {tuple(args.profile)} have been written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import json
+import sys
+import numpy as np
+from equilibrium_engine import (PROFILES, PROFILE_BITS, ENGINES, ORDER_LUT, class_payoffs, equilibrium_mask,
+                                mask_to_profiles, find_saddle_points, _order_code)
+from legacy_scripts import load_legacy
+from parameter_grid import PARAMS, grid_axis
+
+# Differential check of the fast equilibrium code against the scalar v5
+# functions. Points are sampled where a changed comparison would show:
+#
+#   random        uniform points inside b_Cs > b_Ss, b_Cc > b_Sc
+#   exact_tie     b_Ss == b_Cc or b_Sc == b_Cs, where two classes pay exactly the same
+#   near_tie      a few ulps either side of a root of g_i = g_j, found by bisection
+#                 along one parameter
+#   v1_tolerance  points where two class payoffs differ by less than 1e-6 without
+#                 being equal -- what v1's abs(...) < 1e-6 treats as the same payoff
+#   lattice       np.arange grid points, evaluated through the lattice ENGINES
+#
+# Every candidate must return exactly find_equilibria's profiles; each point
+# where it does not is reported with its parameters and class payoffs.
+#
+#   python equilibrium_oracle.py --samples 20000 --report disagreements.json
+
+# b parameters each payoff class depends on, in PAYOFF_CLASSES order
+CLASS_DEPENDS = [['b_Ss'], ['b_Cc'], ['b_Sc', 'b_Cs'], ['b_Sc', 'b_Cs']]
+KINDS = ['random', 'exact_tie', 'near_tie', 'v1_tolerance', 'lattice']
+
+
+# Candidates: (tau, b_Ss, b_Sc, b_Cs, b_Cc) arrays -> masks
+
+def _order_masks(tau, *b):
+    values = np.moveaxis(class_payoffs(tau, *b), -1, 0)
+    return ORDER_LUT[_order_code(values)]
+
+def _scalar_masks(prune):
+    def masks(tau, *b):
+        return np.array([sum(int(PROFILE_BITS[PROFILES.index(eq)]) for eq in find_saddle_points(*point, prune=prune))
+                         for point in zip(tau.tolist(), *(values.tolist() for values in b))], dtype=np.uint16)
+    return masks
+
+POINT_CANDIDATES = {
+    'vectorized': equilibrium_mask,
+    'order_lut': _order_masks,
+    'scalar': _scalar_masks(False),
+    'scalar_pruned': _scalar_masks(True),
+}
+CANDIDATES = list(POINT_CANDIDATES) + [f'lattice:{engine}' for engine in sorted(ENGINES)]
+
+
+def reference_masks(points, version='v5'):
+    find_equilibria = load_legacy(version)['find_equilibria']
+    return np.array([sum(int(PROFILE_BITS[PROFILES.index(eq)]) for eq in find_equilibria(*point))
+                     for point in zip(*(values.tolist() for values in points))], dtype=np.uint16)
+
+
+# Samplers: dicts of tau and b_* arrays
+
+def _constrained(points):
+    return (points['b_Cs'] > points['b_Ss']) & (points['b_Cc'] > points['b_Sc'])
+
+def _select(points, keep):
+    return {key: values[keep] for key, values in points.items()}
+
+def _param_window(points, param):
+    # Interval param may move in without leaving the constraints
+    low, high = np.zeros(len(points['tau'])), np.ones(len(points['tau']))
+    bound = {'b_Ss': ('high', 'b_Cs'), 'b_Cs': ('low', 'b_Ss'), 'b_Sc': ('high', 'b_Cc'), 'b_Cc': ('low', 'b_Sc')}
+    side, other = bound[param]
+    if side == 'high':
+        high = points[other]
+    else:
+        low = points[other]
+    return low, high
+
+def sample_random(rng, taus, n):
+    ss_cs = np.sort(rng.uniform(0, 1, (n, 2)), axis=1)
+    sc_cc = np.sort(rng.uniform(0, 1, (n, 2)), axis=1)
+    points = {'tau': rng.choice(taus, n), 'b_Ss': ss_cs[:, 0], 'b_Sc': sc_cc[:, 0],
+              'b_Cs': ss_cs[:, 1], 'b_Cc': sc_cc[:, 1]}
+    return _select(points, _constrained(points))
+
+def sample_exact_ties(rng, taus, n):
+    # b_Ss == b_Cc or b_Sc == b_Cs; both at once would break the constraints
+    points = sample_random(rng, taus, n)
+    first = rng.uniform(0, 1, len(points['tau'])) < 0.5
+    points['b_Cc'] = np.where(first, points['b_Ss'], points['b_Cc'])
+    points['b_Cs'] = np.where(first, points['b_Cs'], points['b_Sc'])
+    return _select(points, _constrained(points))
+
+def _move(points, param, x):
+    moved = dict(points)
+    for p in PARAMS:
+        moved[p] = np.where(param == p, x, points[p])
+    return moved
+
+def _tie_roots(rng, taus, n, iterations=80):
+    # Points where g_i = g_j to bisection precision, and the parameter that was moved
+    points = sample_random(rng, taus, n)
+    m = len(points['tau'])
+    pairs = [(i, j) for i in range(4) for j in range(i + 1, 4)]
+    pair = rng.integers(0, len(pairs), m)
+    i, j = np.array(pairs)[pair].T
+    choices = [sorted(set(CLASS_DEPENDS[a] + CLASS_DEPENDS[b])) for a, b in pairs]
+    param = np.array([choices[p][rng.integers(len(choices[p]))] for p in pair])
+
+    def gap(x):
+        payoffs = class_payoffs(*(_move(points, param, x)[key] for key in ['tau'] + PARAMS))
+        return payoffs[np.arange(m), i] - payoffs[np.arange(m), j]
+
+    low, high = np.zeros(m), np.ones(m)
+    for p in PARAMS:
+        rows = param == p
+        window = _param_window(points, p)
+        low[rows], high[rows] = window[0][rows], window[1][rows]
+    g_low = gap(low)
+    bracketed = np.sign(g_low) * np.sign(gap(high)) < 0
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        g_middle = gap(middle)
+        left = np.sign(g_middle) == np.sign(g_low)
+        low, g_low = np.where(left, middle, low), np.where(left, g_middle, g_low)
+        high = np.where(left, high, middle)
+    root = _move(points, param, (low + high) / 2)
+    return _select(root, bracketed), param[bracketed]
+
+def _param_values(points, param):
+    return np.array([points[p][k] for k, p in enumerate(param)])
+
+def sample_near_ties(rng, taus, n, ulps=4):
+    roots, param = _tie_roots(rng, taus, n)
+    x = _param_values(roots, param)
+    steps = rng.integers(-ulps, ulps + 1, len(x))
+    direction = np.where(steps < 0, -np.inf, np.inf)
+    for k in range(ulps):
+        x = np.where(np.abs(steps) > k, np.nextafter(x, direction), x)
+    points = _move(roots, param, x)
+    return _select(points, _constrained(points))
+
+def sample_v1_tolerance(rng, taus, n):
+    roots, param = _tie_roots(rng, taus, n)
+    delta = 10 ** rng.uniform(-10, -5, len(param)) * rng.choice([-1, 1], len(param))
+    points = _move(roots, param, _param_values(roots, param) + delta)
+    payoffs = class_payoffs(*(points[key] for key in ['tau'] + PARAMS))
+    gaps = np.abs(payoffs[:, :, None] - payoffs[:, None, :])
+    close = ((gaps > 0) & (gaps < 1e-6)).any(axis=(1, 2))
+    return _select(points, _constrained(points) & close)
+
+def sample_lattice(rng, taus, n, steps=(0.01, 0.005)):
+    # Indices into np.arange(0.01, 1.00, step), ties i_Ss == i_Cc / i_Sc == i_Cs included
+    step = rng.choice(steps, n)
+    indices = {}
+    for key, (low, high) in {'ss_cs': ('b_Ss', 'b_Cs'), 'sc_cc': ('b_Sc', 'b_Cc')}.items():
+        sizes = np.array([len(grid_axis(s)) for s in step])
+        pair = np.sort(np.floor(rng.uniform(0, 1, (n, 2)) * sizes[:, None]).astype(np.int64), axis=1)
+        indices[low], indices[high] = pair[:, 0], pair[:, 1]
+    tie = rng.uniform(0, 1, n)
+    indices['b_Cc'] = np.where(tie < 0.2, indices['b_Ss'], indices['b_Cc'])
+    indices['b_Cs'] = np.where(tie > 0.8, indices['b_Sc'], indices['b_Cs'])
+    keep = (indices['b_Cs'] > indices['b_Ss']) & (indices['b_Cc'] > indices['b_Sc'])
+    return {'tau': rng.choice(taus, n)[keep], 'step': step[keep]} | {p: indices[p][keep] for p in PARAMS}
+
+SAMPLERS = {
+    'random': sample_random,
+    'exact_tie': sample_exact_ties,
+    'near_tie': sample_near_ties,
+    'v1_tolerance': sample_v1_tolerance,
+}
+
+
+def lattice_candidate_masks(engine, lattice):
+    # Per (step, tau) group, evaluated like a sweep chunk
+    masks = np.zeros(len(lattice['tau']), dtype=np.uint16)
+    for step in np.unique(lattice['step']):
+        for tau in np.unique(lattice['tau']):
+            rows = (lattice['step'] == step) & (lattice['tau'] == tau)
+            if rows.any():
+                masks[rows] = ENGINES[engine]((tau,), grid_axis(step), *(lattice[p][rows] for p in PARAMS))[0]
+    return masks
+
+def lattice_points(lattice):
+    points = {'tau': lattice['tau']}
+    for p in PARAMS:
+        points[p] = np.array([grid_axis(step)[index] for step, index in zip(lattice['step'], lattice[p])])
+    return points
+
+def disagreements(kind, candidate, points, expected, found):
+    bad = np.flatnonzero(expected != found)
+    payoffs = class_payoffs(*(points[key][bad] for key in ['tau'] + PARAMS))
+    return [{
+        'kind': kind,
+        'candidate': candidate,
+        'tau': float(points['tau'][k]),
+        **{p: float(points[p][k]) for p in PARAMS},
+        'reference': [list(eq) for eq in mask_to_profiles(expected[k])],
+        'found': [list(eq) for eq in mask_to_profiles(found[k])],
+        'class_payoffs': payoffs[row].tolist(),
+    } for row, k in enumerate(bad)]
+
+def run_oracle(candidates, taus, samples, seed=0, kinds=KINDS, reference='v5'):
+    # Returns (per candidate and kind: number of points checked, list of disagreements)
+    rng = np.random.default_rng(seed)
+    checked, found = {}, []
+    for kind in kinds:
+        if kind == 'lattice':
+            lattice = sample_lattice(rng, taus, samples)
+            points = lattice_points(lattice)
+        else:
+            points = SAMPLERS[kind](rng, taus, samples)
+        expected = reference_masks([points[key] for key in ['tau'] + PARAMS], reference)
+        for candidate in candidates:
+            if candidate.startswith('lattice:') != (kind == 'lattice'):
+                continue
+            if kind == 'lattice':
+                masks = lattice_candidate_masks(candidate.split(':', 1)[1], lattice)
+            else:
+                masks = np.asarray(POINT_CANDIDATES[candidate](*(points[key] for key in ['tau'] + PARAMS)))
+            checked[(candidate, kind)] = len(expected)
+            found += disagreements(kind, candidate, points, expected, masks)
+    return checked, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fast equilibrium code against the scalar v5 functions")
+    parser.add_argument('--candidates', nargs='+', choices=CANDIDATES, default=CANDIDATES)
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS)
+    parser.add_argument('--tau', type=float, nargs='+', default=[0.001, 0.01, 0.05, 0.3])
+    parser.add_argument('--samples', type=int, default=10_000, help="Points drawn per kind (some are rejected)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', help="Write all disagreements to this JSON file")
+    args = parser.parse_args()
+
+    checked, found = run_oracle(args.candidates, np.array(args.tau), args.samples, args.seed, args.kinds)
+    for (candidate, kind), count in checked.items():
+        bad = sum(1 for d in found if d['candidate'] == candidate and d['kind'] == kind)
+        print(f"{candidate:>20} {kind:>13}: {count:7d} points, {bad} disagreements")
+    for d in found[:20]:
+        print(d)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'seed': args.seed, 'taus': args.tau, 'disagreements': found}, f, indent=2)
+        print(f"Disagreements have been written to '{args.report}'")
+    sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+from statistics import NormalDist
+import numpy as np
+from equilibrium_engine import PROFILES, equilibrium_mask
+
+try:
+    from scipy.stats import qmc, t as student_t
+except ImportError:
+    qmc = None
+
+# Share of the constrained region b_Cs > b_Ss, b_Cc > b_Sc (each b in
+# [low, high]) on which each profile is an equilibrium, estimated from random
+# points instead of a full grid. Points come in batches, evaluated for all taus
+# at once with equilibrium_mask; sampling stops as soon as every confidence
+# interval is narrower than +-precision, or at max_points.
+#
+#   uniform  independent uniform points; Wilson score intervals per fraction
+#   sobol    randomized quasi-Monte Carlo: `replicates` independently scrambled
+#            Sobol sequences (scipy.stats.qmc), each drawing batch_size points
+#            per round (a power of 2); intervals from the spread of the
+#            replicate estimates (Student t). Converges much faster than uniform.
+#
+# A uniform point on the constrained region is a uniform point of the cube with
+# each pair (b_Ss, b_Cs), (b_Sc, b_Cc) sorted. Ties b_Ss == b_Cc and
+# b_Sc == b_Cs have volume 0 here, while the lattice of the sweeps contains
+# them, so lattice shares (Occurrences / points) differ slightly at coarse steps.
+#
+#   python equilibrium_sampling.py --tau 0.001 0.05 --precision 0.0005
+
+METHODS = ['uniform', 'sobol']
+
+
+def constrained_points(u, low=0.01, high=0.99):
+    # (n, 4) points of the unit cube -> b_Ss, b_Sc, b_Cs, b_Cc on the constrained region
+    x = low + (high - low) * u
+    return (np.minimum(x[:, 0], x[:, 1]), np.minimum(x[:, 2], x[:, 3]),
+            np.maximum(x[:, 0], x[:, 1]), np.maximum(x[:, 2], x[:, 3]))
+
+def profile_counts(taus, points):
+    # (n_tau, n_profiles): points where each profile is an equilibrium
+    masks = equilibrium_mask(np.asarray(taus)[:, None], *points)
+    return np.stack([np.count_nonzero((masks >> k) & 1, axis=1) for k in range(len(PROFILES))], axis=1)
+
+def wilson_interval(counts, n, confidence):
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = counts / n
+    center = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+    half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    return center - half, center + half
+
+def region_volume(low=0.01, high=0.99):
+    # Lebesgue volume of the constrained region
+    return ((high - low)**2 / 2)**2
+
+
+def sample_uniform(taus, confidence, batch_size, rng, low, high):
+    counts, n = np.zeros((len(taus), len(PROFILES)), dtype=np.int64), 0
+    while True:
+        counts += profile_counts(taus, constrained_points(rng.uniform(size=(batch_size, 4)), low, high))
+        n += batch_size
+        ci_low, ci_high = wilson_interval(counts, n, confidence)
+        yield n, counts / n, np.clip(ci_low, 0, 1), np.clip(ci_high, 0, 1)
+
+def sample_sobol(taus, confidence, batch_size, replicates, rng, low, high):
+    if qmc is None:
+        raise ImportError("Sobol sampling needs scipy (scipy.stats.qmc)")
+    engines = [qmc.Sobol(4, scramble=True, seed=rng) for _ in range(replicates)]
+    counts, n = np.zeros((replicates, len(taus), len(PROFILES)), dtype=np.int64), 0
+    t = student_t.ppf((1 + confidence) / 2, replicates - 1)
+    while True:
+        for r, engine in enumerate(engines):
+            counts[r] += profile_counts(taus, constrained_points(engine.random(batch_size), low, high))
+        n += batch_size
+        estimates = counts / n
+        fraction = estimates.mean(axis=0)
+        half = t * estimates.std(axis=0, ddof=1) / np.sqrt(replicates)
+        yield n * replicates, fraction, np.clip(fraction - half, 0, 1), np.clip(fraction + half, 0, 1)
+
+def sample_volumes(taus, precision=1e-3, confidence=0.95, method='sobol', batch_size=2**14, replicates=16,
+                   max_points=10**8, seed=0, low=0.01, high=0.99):
+    # Returns per tau and profile the volume fraction and its confidence interval
+    rng = np.random.default_rng(seed)
+    if method == 'sobol':
+        batch_size = 1 << max(0, int(batch_size - 1).bit_length())  # Sobol points come in powers of 2
+        rounds = sample_sobol(taus, confidence, batch_size, replicates, rng, low, high)
+    else:
+        rounds = sample_uniform(taus, confidence, batch_size, rng, low, high)
+    history = []
+    for points, fraction, ci_low, ci_high in rounds:
+        half_width = float((ci_high - ci_low).max()) / 2
+        history.append({'points': points, 'max_half_width': half_width})
+        converged = half_width <= precision
+        if converged or points >= max_points:
+            break
+    return {
+        'taus': list(taus),
+        'method': method,
+        'confidence': confidence,
+        'precision': precision,
+        'points': points,
+        'converged': converged,
+        'fraction': fraction,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'region_volume': region_volume(low, high),
+        'history': history,
+    }
+
+
+def print_volumes(result, show_unseen=False):
+    # Profiles no point landed on are skipped, or with show_unseen listed with
+    # the upper end of their interval
+    print(f"{result['points']} points ({result['method']}), "
+          f"{'converged' if result['converged'] else 'stopped at max points'}: "
+          f"{result['confidence']:.0%} intervals within +-{result['history'][-1]['max_half_width']:.2g}")
+    for t, tau in enumerate(result['taus']):
+        print(f"\nEquilibrium Volume Fractions (tau={tau}):")
+        for k, eq in enumerate(PROFILES):
+            if result['fraction'][t, k] == 0:
+                if show_unseen:
+                    print(f"{eq}: not sampled, at most {result['ci_high'][t, k]:.6f}")
+                continue
+            print(f"{eq}: {result['fraction'][t, k]:.6f} "
+                  f"[{result['ci_low'][t, k]:.6f}, {result['ci_high'][t, k]:.6f}], "
+                  f"volume {result['fraction'][t, k] * result['region_volume']:.6f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the parameter volume of each equilibrium by sampling")
+    parser.add_argument('--tau', type=float, nargs='+', default=[0.001])
+    parser.add_argument('--method', choices=METHODS, default='sobol' if qmc else 'uniform')
+    parser.add_argument('--precision', type=float, default=1e-3, help="Stop once every interval is within +- this")
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--batch-size', type=int, default=2**14, help="Points per round (per replicate for sobol)")
+    parser.add_argument('--replicates', type=int, default=16, help="Scrambled Sobol sequences (sobol only)")
+    parser.add_argument('--max-points', type=int, default=10**8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--low', type=float, default=0.01)
+    parser.add_argument('--high', type=float, default=0.99)
+    parser.add_argument('--show-unseen', action='store_true', help="Also list profiles no point landed on, with their upper bound")
+    parser.add_argument('--output', help="Write the estimates to this JSON file")
+    args = parser.parse_args()
+
+    result = sample_volumes(args.tau, args.precision, args.confidence, args.method, args.batch_size,
+                            args.replicates, args.max_points, args.seed, args.low, args.high)
+    print_volumes(result, args.show_unseen)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in result.items()}
+                      | {'profiles': [list(eq) for eq in PROFILES]}, f, indent=2)
+        print(f"Volume estimates have been written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
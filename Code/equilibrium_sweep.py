@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from equilibrium_engine import PROFILES, ENGINES, engine_payoff_evaluations
+from equilibrium_store import reuse_masks, reuse_plan
+from mixed_equilibrium import lattice_supports, support_label
+from parameter_grid import PARAMS, grid_axis, constrained_size, constrained_indices, chunk_ranges
+from sweep_profiler import stage
+
+# Chunked sweep over the constrained lattice. Workers reduce their chunk to a
+# summary -- per tau and profile the number of points where it is an equilibrium
+# and the lowest/highest lattice index of each parameter among them -- so what
+# travels back to the parent is O(#taus x #profiles), not O(#points). The
+# per-point equilibrium masks (uint16, one bit per profile) are only sent back
+# when asked for.
+#
+# All taus of a sweep are evaluated together: tau is the leading axis of the
+# engine tables, of the summaries and of the masks.
+#
+# Points already held by finished stores of earlier sweeps (reuse paths, see
+# equilibrium_store.py) are copied from there; 'evaluated' counts, per tau, the
+# points the engine actually had to compute.
+#
+# With mixed, points without a pure equilibrium are solved as zero-sum games
+# (mixed_equilibrium.py); 'mixed' counts them per tau and support code.
+
+NO_INDEX = np.iinfo(np.int32).max
+
+
+def empty_summary(num_taus=1, num_bits=len(PROFILES)):
+    # num_bits: mask bits summarized (deviation_census.py uses other masks)
+    return {
+        'count': np.zeros((num_taus, num_bits), dtype=np.int64),
+        'low': np.full((num_taus, num_bits, len(PARAMS)), NO_INDEX, dtype=np.int32),
+        'high': np.full((num_taus, num_bits, len(PARAMS)), -1, dtype=np.int32),
+        'evaluated': np.zeros(num_taus, dtype=np.int64),
+        'mixed': np.zeros((num_taus, 256), dtype=np.int64),
+    }
+
+def summarize_masks(masks, indices, num_bits=len(PROFILES)):
+    # masks has shape (n_tau, n_points)
+    summary = empty_summary(len(masks), num_bits)
+    for t, tau_masks in enumerate(masks):
+        for k in range(num_bits):
+            hits = (tau_masks >> k) & 1 == 1
+            count = np.count_nonzero(hits)
+            if count:
+                summary['count'][t, k] = count
+                for p, index in enumerate(indices):
+                    index = index[hits]
+                    summary['low'][t, k, p] = index.min()
+                    summary['high'][t, k, p] = index.max()
+    return summary
+
+def merge_summaries(total, summary):
+    total['count'] += summary['count']
+    np.minimum(total['low'], summary['low'], out=total['low'])
+    np.maximum(total['high'], summary['high'], out=total['high'])
+    total['evaluated'] += summary['evaluated']
+    total['mixed'] += summary['mixed']
+    return total
+
+def summary_to_json(summary):
+    return {key: values.tolist() for key, values in summary.items()}
+
+def summary_from_json(state):
+    summary = empty_summary()
+    for key, values in state.items():
+        summary[key] = np.array(values, dtype=summary[key].dtype)
+    return summary
+
+def sweep_chunk(args):
+    # Generates and evaluates lattice points start..stop-1; only the range is pickled.
+    # stats holds the chunk's stage timings and counters (see sweep_profiler.py).
+    taus, step, start, stop, engine, keep_masks, reuse, mixed = args
+    stats = {'pid': os.getpid(), 'started': time.time(), 'stages': {}}
+    axis = grid_axis(step)
+    with stage(stats['stages'], 'indices'):
+        indices = constrained_indices(len(axis), start, stop)
+    if reuse and reuse_plan(reuse, taus, step):
+        with stage(stats['stages'], 'reuse'):
+            masks, known = reuse_masks(reuse, taus, step, indices)
+        with stage(stats['stages'], 'engine'):
+            # Only taus with missing points, and only their missing points, go to the engine
+            open_taus = np.flatnonzero(~known.all(axis=1))
+            missing = ~known[open_taus].all(axis=0)
+            if missing.all():
+                fresh = ENGINES[engine](tuple(taus[t] for t in open_taus), axis, *indices)
+                masks[open_taus] = np.where(known[open_taus], masks[open_taus], fresh)
+            elif missing.any():
+                fresh = ENGINES[engine](tuple(taus[t] for t in open_taus), axis, *(index[missing] for index in indices))
+                masks[np.ix_(open_taus, missing)] = np.where(known[np.ix_(open_taus, missing)],
+                                                             masks[np.ix_(open_taus, missing)], fresh)
+        evaluated = (~known).sum(axis=1)
+        fresh_points = int(missing.sum()) if len(open_taus) else 0
+        engine_taus = len(open_taus)
+    else:
+        with stage(stats['stages'], 'engine'):
+            masks = ENGINES[engine](taus, axis, *indices)
+        evaluated = np.full(len(taus), stop - start)
+        fresh_points, engine_taus = stop - start, len(taus)
+    with stage(stats['stages'], 'summarize'):
+        summary = summarize_masks(masks, indices)
+    summary['evaluated'][:] = evaluated
+    if mixed:
+        with stage(stats['stages'], 'mixed'):
+            supports = lattice_supports(taus, axis, indices, masks)
+            for t in range(len(taus)):
+                summary['mixed'][t] = np.bincount(supports[t, masks[t] == 0], minlength=256)
+    stats['counts'] = {
+        'points': (stop - start) * len(taus),
+        'evaluated': int(evaluated.sum()),
+        'class_payoff_evaluations': engine_payoff_evaluations(engine, engine_taus, len(axis), fresh_points) if fresh_points else 0,
+        'equilibrium_checks': int(evaluated.sum()) * len(PROFILES),
+    }
+    stats['finished'] = time.time()
+    return start, stop, summary, masks if keep_masks else None, stats
+
+def sweep_tasks(taus, step, engine='separable', chunk_size=1_000_000, keep_masks=False, reuse=(), mixed=False):
+    # reuse: paths of finished stores whose points are copied instead of evaluated
+    total = constrained_size(len(grid_axis(step)))
+    return [(tuple(taus), step, start, stop, engine, keep_masks, tuple(reuse), mixed)
+            for start, stop in chunk_ranges(total, chunk_size)]
+
+def iter_sweep(pool, tasks):
+    # Chunk results in task order, as (start, stop, summary, masks or None, stats)
+    return pool.imap(sweep_chunk, tasks)
+
+def profile_points(step, start, stop, masks, profile):
+    # Lattice indices of the points in one chunk where profile is an equilibrium,
+    # for masks of a single tau
+    k = PROFILES.index(profile)
+    indices = constrained_indices(len(grid_axis(step)), start, stop)
+    hits = (masks >> k) & 1 == 1
+    return tuple(index[hits] for index in indices)
+
+def tau_label(taus):
+    # File name part for a set of taus; different tau lists never share a name
+    if len(taus) == 1:
+        return f'tau_{taus[0]}'
+    if len(taus) <= 4:
+        return 'taus_' + '_'.join(map(str, taus))
+    digest = hashlib.sha256(json.dumps([float(tau) for tau in taus]).encode()).hexdigest()[:8]
+    return f'taus_{taus[0]}-{taus[-1]}_x{len(taus)}_{digest}'
+
+def print_summary(summary, taus, step, mixed=False):
+    axis = grid_axis(step)
+    for t, tau in enumerate(taus):
+        print(f"All Pure Strategy Equilibria (tau={tau}):")
+        for k, eq in enumerate(PROFILES):
+            if summary['count'][t, k] == 0:
+                continue
+            print(f"\nEquilibrium: {eq}")
+            print(f"Occurrences: {summary['count'][t, k]}")
+            print("Parameter Ranges:")
+            for p, param in enumerate(PARAMS):
+                print(f"  {param}: [{axis[summary['low'][t, k, p]]:.2f}, {axis[summary['high'][t, k, p]]:.2f}]")
+        if mixed:
+            print(f"\nPoints without a pure strategy equilibrium: {summary['mixed'][t].sum()}")
+            for code in np.flatnonzero(summary['mixed'][t]):
+                print(f"  Mixed equilibrium on {support_label(code)}: {summary['mixed'][t, code]}")
+        print()
@@ -0,0 +1,233 @@
+import argparse
+import json
+import numpy as np
+
+# Batched version of simulate_game_dynamics from game_dynamics.py and
+# game_dynamics_deviation.py. Players alternate (player 1 first) from state 'S',
+# each answering the last action with its strategy. The system has only
+# (last action, player to move, deviation used) = 8 states, so every run is a
+# prefix followed by a cycle that repeats forever; both are found within 8
+# moves and returned as integer arrays for a whole batch of runs at once.
+#
+#   ACTIONS            'S' = 0, 'C' = 1
+#   action table       table[strategy, last action] -> action, strategies indexed
+#                      like STRATEGIES. With first='S' (game_dynamics_deviation.py)
+#                      strategy[0] answers 'S'; with first='C' (game_dynamics.py)
+#                      strategy[0] answers 'C'.
+#   deviation          (player, strategy): a one-shot deviation as in
+#                      game_dynamics_deviation.py -- at the player's first turn
+#                      where strategy would act differently, it plays that action
+#                      once and then goes back to its own strategy
+#
+# simulate_batch returns a dict of arrays over runs: prefix / cycle (actions,
+# padded with -1), their lengths, and the move at which the deviation happened
+# (-1 if it never does). Cycles are cycles of the full state, so they always
+# have even length. The state after any number of moves is then an index
+# computation (state_at), and counts over long horizons cost O(cycle length).
+#
+#   python game_dynamics_batch.py --output dynamics.json
+#   python game_dynamics_batch.py --profiles CC,SS CS,CS --steps 20
+
+STRATEGIES = ['SS', 'SC', 'CS', 'CC']
+ACTIONS = ['S', 'C']
+# Most states a run can visit before repeating one
+MAX_STATES = 8
+NO_DEVIATION = -1
+
+
+def action_table(first='S', strategies=STRATEGIES):
+    table = np.empty((len(strategies), len(ACTIONS)), dtype=np.int8)
+    for k, strategy in enumerate(strategies):
+        replies = strategy if first == 'S' else strategy[::-1]
+        table[k] = [ACTIONS.index(action) for action in replies]
+    return table
+
+ACTION_TABLE = action_table()
+
+
+def all_runs(strategies=STRATEGIES):
+    # Every profile without deviation, then each deviation of player 1 and of
+    # player 2 to another strategy -- the runs of run_simulations, for all profiles
+    player1, player2, deviation_player, deviation_strategy = [], [], [], []
+    for i in range(len(strategies)):
+        for j in range(len(strategies)):
+            runs = [(0, NO_DEVIATION)]
+            runs += [(1, k) for k in range(len(strategies)) if k != i]
+            runs += [(2, k) for k in range(len(strategies)) if k != j]
+            for player, strategy in runs:
+                player1.append(i)
+                player2.append(j)
+                deviation_player.append(player)
+                deviation_strategy.append(strategy)
+    return tuple(np.array(values, dtype=np.intp) for values in
+                 (player1, player2, deviation_player, deviation_strategy))
+
+def simulate_batch(player1, player2, deviation_player=None, deviation_strategy=None, table=ACTION_TABLE):
+    # Strategy indices per run; deviation_player is 0 (none), 1 or 2
+    player1, player2 = np.broadcast_arrays(np.asarray(player1, dtype=np.intp), np.asarray(player2, dtype=np.intp))
+    runs = len(player1)
+    if deviation_player is None:
+        deviation_player = np.zeros(runs, dtype=np.intp)
+        deviation_strategy = np.zeros(runs, dtype=np.intp)
+    deviation_player = np.asarray(deviation_player, dtype=np.intp)
+    deviation_strategy = np.where(deviation_player > 0, deviation_strategy, 0)
+    rows = np.arange(runs)
+
+    action = np.zeros(runs, dtype=np.intp)  # state 'S'
+    deviated = np.zeros(runs, dtype=bool)
+    deviation_step = np.full(runs, NO_DEVIATION, dtype=np.intp)
+    first_seen = np.full((runs, MAX_STATES), -1, dtype=np.intp)
+    cycle_start = np.full(runs, -1, dtype=np.intp)
+    cycle_stop = np.full(runs, -1, dtype=np.intp)
+    states = np.full((runs, MAX_STATES + 1), -1, dtype=np.int8)
+
+    for t in range(MAX_STATES + 1):
+        state = action + 2 * (t % 2) + 4 * deviated
+        open_runs = cycle_stop < 0
+        seen = first_seen[rows, state]
+        closing = open_runs & (seen >= 0)
+        cycle_start[closing], cycle_stop[closing] = seen[closing], t
+        first_seen[rows[open_runs], state[open_runs]] = t
+        states[open_runs, t] = action[open_runs]
+        if (cycle_stop >= 0).all():
+            break
+
+        mover = t % 2 + 1
+        own = table[player1 if mover == 1 else player2, action]
+        other = table[deviation_strategy, action]
+        deviate = (deviation_player == mover) & ~deviated & (other != own)
+        deviation_step[deviate] = t
+        deviated |= deviate
+        action = np.where(deviate, other, own)
+
+    prefix_length = cycle_start
+    cycle_length = cycle_stop - cycle_start
+    width = np.arange(MAX_STATES)
+    prefix = np.where(width < prefix_length[:, None], states[:, :MAX_STATES], -1).astype(np.int8)
+    cycle_index = np.minimum(prefix_length[:, None] + width, MAX_STATES)
+    cycle = np.where(width < cycle_length[:, None], states[rows[:, None], cycle_index], -1).astype(np.int8)
+    return {
+        'player1': player1,
+        'player2': player2,
+        'deviation_player': deviation_player,
+        'deviation_strategy': np.where(deviation_player > 0, deviation_strategy, NO_DEVIATION),
+        'prefix': prefix,
+        'prefix_length': prefix_length,
+        'cycle': cycle,
+        'cycle_length': cycle_length,
+        'deviation_step': deviation_step,
+    }
+
+
+def state_at(dynamics, t):
+    # Action after t moves (t = 0 is the start state), per run; t broadcasts
+    t = np.asarray(t)
+    prefix_length = dynamics['prefix_length'].reshape((-1,) + (1,) * t.ndim)
+    cycle_length = dynamics['cycle_length'].reshape(prefix_length.shape)
+    in_prefix = t < prefix_length
+    index = np.where(in_prefix, t, (t - prefix_length) % cycle_length)
+    index = np.minimum(index, MAX_STATES - 1)
+    rows = np.arange(len(prefix_length)).reshape(prefix_length.shape)
+    return np.where(in_prefix, dynamics['prefix'][rows, index], dynamics['cycle'][rows, index])
+
+def trajectories(dynamics, steps):
+    # (runs, steps + 1) actions, the sequence simulate_game_dynamics joins
+    return state_at(dynamics, np.arange(steps + 1))
+
+def count_actions(dynamics, steps, value=1):
+    # How often each run is in state ACTIONS[value] after 0..steps moves
+    width = np.arange(MAX_STATES)
+    prefix_length, cycle_length = dynamics['prefix_length'], dynamics['cycle_length']
+    length = steps + 1
+    in_prefix = np.minimum(length, prefix_length)
+    count = ((dynamics['prefix'] == value) & (width < in_prefix[:, None])).sum(axis=1)
+    rest = length - in_prefix
+    full, partial = rest // cycle_length, rest % cycle_length
+    is_value = dynamics['cycle'] == value
+    count += full * is_value.sum(axis=1) + (is_value & (width < partial[:, None])).sum(axis=1)
+    return count
+
+def dynamic_string(dynamics, run, steps):
+    # The string simulate_game_dynamics returns for this run
+    return '—>'.join(ACTIONS[action] for action in trajectories(dynamics, steps)[run])
+
+
+# Payoff classes. Without deviations, the dynamics of most profiles settle on one
+# (player 1 action, player 2 answer) pair, and that pair is the profile's payoff
+# class: Ss, Cc, Sc, Cs as in payoff(). A cycle that alternates between pairs
+# does not single one out; the model assigns those by hand, keyed by the pairs
+# of the cycle (from its smallest rotation).
+
+CLASS_ACTIONS = ['SS', 'CC', 'SC', 'CS']
+CYCLE_CLASSES = {
+    ('CS', 'SC'): 'CS',  # (SC, CS)
+    ('CC', 'SS'): 'SC',  # (CS, SC)
+}
+
+def cycle_pairs(dynamics, run):
+    # Player 1's action and player 2's answer, once around the cycle; player 1
+    # moves from even states, so the pairs are states (2k+1, 2k+2)
+    first = dynamics['prefix_length'][run] // 2
+    k = np.arange(first, first + dynamics['cycle_length'][run] // 2)
+    states = trajectories(dynamics, 2 * k[-1] + 2)[run]
+    pairs = [ACTIONS[states[2*m + 1]] + ACTIONS[states[2*m + 2]] for m in k]
+    return min(tuple(pairs[r:] + pairs[:r]) for r in range(len(pairs)))
+
+def profile_classes(strategies=STRATEGIES, first='S', cycle_classes=CYCLE_CLASSES):
+    # table[i, j] = payoff class (index into CLASS_ACTIONS) of (strategies[i], strategies[j])
+    n = len(strategies)
+    player1, player2 = np.divmod(np.arange(n * n), n)
+    dynamics = simulate_batch(player1, player2, table=action_table(first, strategies))
+    table = np.empty(n * n, dtype=np.intp)
+    for run in range(n * n):
+        pairs = cycle_pairs(dynamics, run)
+        if len(set(pairs)) > 1 and pairs not in cycle_classes:
+            profile = (strategies[player1[run]], strategies[player2[run]])
+            raise ValueError(f"Profile {profile} cycles through {pairs}; it needs an entry in cycle_classes")
+        table[run] = CLASS_ACTIONS.index(pairs[0] if len(set(pairs)) == 1 else cycle_classes[pairs])
+    return table.reshape(n, n)
+
+
+def dynamics_records(dynamics, strategies=STRATEGIES):
+    records = []
+    for r in range(len(dynamics['player1'])):
+        player = int(dynamics['deviation_player'][r])
+        records.append({
+            'profile': [strategies[dynamics['player1'][r]], strategies[dynamics['player2'][r]]],
+            'deviation': [player, strategies[dynamics['deviation_strategy'][r]]] if player else None,
+            'prefix': ''.join(ACTIONS[a] for a in dynamics['prefix'][r, :dynamics['prefix_length'][r]]),
+            'cycle': ''.join(ACTIONS[a] for a in dynamics['cycle'][r, :dynamics['cycle_length'][r]]),
+            'deviation_step': int(dynamics['deviation_step'][r]) if dynamics['deviation_step'][r] >= 0 else None,
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix and cycle of the game dynamics of every profile and deviation")
+    parser.add_argument('--profiles', nargs='+', help="Profiles as P1,P2 (default: all)")
+    parser.add_argument('--first', choices=ACTIONS, default='S',
+                        help="Opponent action the first letter of a strategy answers (C: game_dynamics.py)")
+    parser.add_argument('--steps', type=int, help="Also print each trajectory up to this many moves")
+    parser.add_argument('--output', help="Write the runs to this JSON file")
+    args = parser.parse_args()
+
+    runs = all_runs()
+    if args.profiles:
+        wanted = {tuple(STRATEGIES.index(s) for s in profile.split(',')) for profile in args.profiles}
+        keep = np.array([(i, j) in wanted for i, j in zip(runs[0], runs[1])])
+        runs = tuple(values[keep] for values in runs)
+    dynamics = simulate_batch(*runs, table=action_table(args.first))
+    records = dynamics_records(dynamics)
+    for r, record in enumerate(records):
+        deviation = f"player {record['deviation'][0]} -> {record['deviation'][1]}" if record['deviation'] else 'no deviation'
+        print(f"{tuple(record['profile'])} {deviation}: prefix {record['prefix'] or '-'}, cycle {record['cycle']}, "
+              f"deviation step {record['deviation_step']}")
+        if args.steps is not None:
+            print(dynamic_string(dynamics, r, args.steps))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'first': args.first, 'strategies': STRATEGIES, 'runs': records}, f, indent=2)
+        print(f"Game dynamics have been written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
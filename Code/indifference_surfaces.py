@@ -0,0 +1,255 @@
+import argparse
+import numpy as np
+from equilibrium_engine import PROFILES, CLASS_PAIRS, ORDER_LUT, class_payoffs
+from parameter_grid import PARAMS
+
+# Analytic region boundaries. Every class payoff in payoff() has the form
+#
+#   g = (tau + u(1-b)F) / (tau + u(b + (1-b)F)) = 1 / (1 + u R),
+#   R = b / N,  u = 1 - tau,  F = tau + u f,  N = tau + u(1-b)F > 0,
+#
+# with (b, f) = (b_Ss, b_Ss), (b_Cc, b_Cc), (b_Sc, b_Cs), (b_Cs, b_Sc) for the
+# four classes. So g_i > g_j exactly when R_i < R_j, and R_i = R_j is the
+# indifference surface between classes i and j (P_ij = b_j N_i - b_i N_j = 0).
+# R increases with b and decreases with f, and R(x, x) increases with x, so along
+# any axis each class ratio is constant or monotone: every surface crosses a
+# line at most once, at a point with a closed form (class_crossing: a linear
+# equation in b or f, or a quadratic on the diagonal b = f). The equilibrium set
+# only depends on the ordering of the four ratios (see ORDER_LUT in
+# equilibrium_engine.py), so it is constant between consecutive crossings and
+# each line is decided by one evaluation per interval instead of one per point.
+#
+# Lines are not enumerated over the whole grid of the other three parameters.
+# One of them is a diagonal class parameter q (FREE_PARAM); with the other two
+# fixed, a line's sequence of intervals only changes shape where q's class ratio
+# meets another class's ratio at a crossing or window end that does not depend
+# on q (or q meets its constraint). Between those critical values of q the
+# interval ends are constant or monotone in q, so the extents are reached at the
+# grid values of q next to them, and only those lines are evaluated
+# (axis_lines): 12 to 16 per pair of values of the other two parameters at
+# step 0.01, instead of all 99.
+
+# (b, f) of each payoff class, in PAYOFF_CLASSES order
+CLASS_PARAMS = [('b_Ss', 'b_Ss'), ('b_Cc', 'b_Cc'), ('b_Sc', 'b_Cs'), ('b_Cs', 'b_Sc')]
+CONSTRAINTS = [('b_Ss', 'b_Cs'), ('b_Sc', 'b_Cc')]  # (low, high): low < high
+FREE_PARAM = {'b_Ss': 'b_Cc', 'b_Cc': 'b_Ss', 'b_Sc': 'b_Ss', 'b_Cs': 'b_Cc'}
+
+
+def class_ratio(tau, b, f):
+    u = 1 - tau
+    return b / (tau + u * (1 - b) * (tau + u * f))
+
+def _solve_b(tau, r, f):
+    # b with class_ratio(b, f) = r
+    u = 1 - tau
+    F = tau + u * f
+    return r * (tau + u * F) / (1 + r * u * F)
+
+def _solve_f(tau, r, b):
+    # f with class_ratio(b, f) = r
+    u = 1 - tau
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((b / r - tau) / (u * (1 - b)) - tau) / u
+
+def _solve_diagonal(tau, r):
+    # x with class_ratio(x, x) = r: the positive root of r u^2 x^2 + (1 - r u (u - tau)) x - r tau (1 + u)
+    u = 1 - tau
+    a, b, c = r * u**2, 1 - r * u * (u - tau), -r * tau * (1 + u)
+    return 2 * c / (-b - np.sqrt(b**2 - 4 * a * c))
+
+def _line_values(axis_param, fixed, x):
+    return dict(fixed, **{axis_param: x})
+
+def class_crossing(tau, axis_param, fixed, c, r):
+    # Where class c's ratio along axis_param equals r (c must vary along the axis)
+    b_param, f_param = CLASS_PARAMS[c]
+    if b_param == f_param:
+        return _solve_diagonal(tau, r)
+    if axis_param == b_param:
+        return _solve_b(tau, r, fixed[f_param])
+    return _solve_f(tau, r, fixed[b_param])
+
+def _varies(c, axis_param):
+    return axis_param in CLASS_PARAMS[c]
+
+def line_crossings(tau, axis_param, fixed, pairs=CLASS_PAIRS):
+    # Crossing of each class pair's surface along the lines, NaN if the pair does not change; (K, len(pairs))
+    K = len(next(iter(fixed.values())))
+    roots = np.full((K, len(pairs)), np.nan)
+    for k, (i, j) in enumerate(pairs):
+        if _varies(i, axis_param) and _varies(j, axis_param):
+            # Sc against Cs: R(x, y) = R(y, x) exactly at x = y
+            other, = {p for p in CLASS_PARAMS[i] if p != axis_param}
+            roots[:, k] = fixed[other]
+        elif _varies(i, axis_param) or _varies(j, axis_param):
+            moving, still = (i, j) if _varies(i, axis_param) else (j, i)
+            b_param, f_param = CLASS_PARAMS[still]
+            if CLASS_PARAMS[moving][0] == CLASS_PARAMS[moving][1] and b_param == f_param:
+                roots[:, k] = fixed[b_param]  # Ss against Cc: exactly at b_Ss = b_Cc
+            else:
+                r = class_ratio(tau, fixed[b_param], fixed[f_param])
+                roots[:, k] = class_crossing(tau, axis_param, fixed, moving, r)
+    return roots
+
+
+def _snap_exact_ties(tau, axis_param, fixed, pair, roots):
+    # Grids sample the other parameters' values exactly, so a crossing found a
+    # few ulps off such a value is moved onto it when the class payoffs are
+    # exactly equal there. Returns the roots and which of them were snapped.
+    i, j = pair
+    snapped = np.zeros(roots.shape, dtype=bool)
+    for value in fixed.values():
+        near = np.abs(roots - value) <= 1e-9
+        if not near.any():
+            continue
+        point = {p: (np.asarray(fixed[p]) if p != axis_param else value) for p in PARAMS}
+        payoffs = class_payoffs(tau, *(point[p] for p in PARAMS))
+        snap = near & (payoffs[:, i] == payoffs[:, j])
+        roots[snap] = value[snap]
+        snapped |= snap
+    return roots, snapped
+
+def _masks_at(tau, axis_param, fixed, x, owner):
+    # Equilibrium masks at points x of the lines (one per line); owner is the
+    # CLASS_PAIRS index of the surface each point is known to lie on, or -1
+    values = _line_values(axis_param, fixed, x)
+    payoffs = class_payoffs(tau, *(values[p] for p in PARAMS))
+    code = 0
+    for k, (i, j) in enumerate(CLASS_PAIRS):
+        sign = np.sign(payoffs[..., i] - payoffs[..., j]).astype(np.int16)
+        sign[owner == k] = 0
+        code = code + (sign + 1) * 3**k
+    return ORDER_LUT[code]
+
+def _constraint_window(axis_param, fixed, low, high):
+    # Open interval of axis_param allowed by b_Cs > b_Ss and b_Cc > b_Sc
+    K = len(next(iter(fixed.values())))
+    low, high = np.full(K, low), np.full(K, high)
+    for small, large in CONSTRAINTS:
+        if axis_param == small:
+            high = np.minimum(high, fixed[large])
+        elif axis_param == large:
+            low = np.maximum(low, fixed[small])
+        elif small in fixed and large in fixed:
+            # Lines that already violate the other constraint are empty
+            high = np.where(fixed[large] > fixed[small], high, low)
+    return low, high
+
+def line_regions(tau, axis_param, fixed, low=0.01, high=0.99, include_ties=False):
+    # Splits each line into intervals and root points with constant equilibrium
+    # set. Roots on the exact-tie planes b_Ss = b_Cc and b_Sc = b_Cs are always
+    # kept, since grids sample those planes; other isolated roots only with
+    # include_ties.
+    # Returns (starts, ends, masks), each (K, m); NaN starts mark unused slots.
+    win_low, win_high = _constraint_window(axis_param, fixed, low, high)
+    closed_low = win_low == low   # Domain ends are included, constraint ends are not
+    closed_high = win_high == high
+
+    points = line_crossings(tau, axis_param, fixed)
+    exact = np.zeros(points.shape, dtype=bool)
+    for k, pair in enumerate(CLASS_PAIRS):
+        points[:, k], exact[:, k] = _snap_exact_ties(tau, axis_param, fixed, pair, points[:, k])
+    points[~((points > win_low[:, None]) & (points < win_high[:, None]))] = np.nan
+    owner = np.broadcast_to(np.arange(len(CLASS_PAIRS)), points.shape)
+    order = np.argsort(points, axis=1)  # NaNs sort last
+    points = np.take_along_axis(points, order, axis=1)
+    owner = np.take_along_axis(owner, order, axis=1)
+    exact = np.take_along_axis(exact, order, axis=1)
+
+    # Open intervals between consecutive breakpoints
+    edges = np.concatenate([win_low[:, None], points, win_high[:, None]], axis=1)
+    edges = np.where(np.isnan(edges), win_high[:, None], edges)
+    starts, ends = edges[:, :-1], edges[:, 1:]
+    empty = ~(ends > starts)
+
+    # Roots themselves, where one class pair ties
+    missing = np.isnan(points) | ~(exact | include_ties)
+
+    # Closed domain ends
+    end_points = np.stack([win_low, win_high], axis=1)
+    end_missing = ~np.stack([closed_low, closed_high], axis=1) | (win_high <= win_low)[:, None]
+
+    starts = np.concatenate([np.where(empty, np.nan, starts), np.where(missing, np.nan, points),
+                             np.where(end_missing, np.nan, end_points)], axis=1)
+    ends = np.concatenate([ends, points, end_points], axis=1)
+    owner = np.concatenate([np.full(empty.shape, -1), owner, np.full(end_points.shape, -1)], axis=1)
+
+    # Only the used slots are evaluated, intervals at their midpoint
+    used = ~np.isnan(starts)
+    rows = np.nonzero(used)[0]
+    masks = np.zeros(starts.shape, dtype=ORDER_LUT.dtype)
+    masks[used] = _masks_at(tau, axis_param, {p: v[rows] for p, v in fixed.items()},
+                            (starts[used] + ends[used]) / 2, owner[used])
+    return starts, ends, masks
+
+def axis_lines(tau, axis_param, grid, low=0.01, high=0.99):
+    # Grid lines along axis_param whose regions reach the axis extents, as a dict
+    # of fixed values of the other three parameters (see the comment at the top)
+    q = FREE_PARAM[axis_param]
+    q_class = CLASS_PARAMS.index((q, q))
+    rest = [p for p in PARAMS if p not in (axis_param, q)]
+    fixed = {p: values.ravel() for p, values in zip(rest, np.meshgrid(grid, grid, indexing='ij'))}
+
+    # Points of the line that do not move with q: window ends and crossings of the other classes
+    win_low, win_high = _constraint_window(axis_param, fixed, low, high)
+    pairs = [pair for pair in CLASS_PAIRS if q_class not in pair]
+    events = np.concatenate([win_low[:, None], win_high[:, None], line_crossings(tau, axis_param, fixed, pairs)], axis=1)
+    values = _line_values(axis_param, {p: v[:, None] for p, v in fixed.items()}, events)
+    critical = [_solve_diagonal(tau, class_ratio(tau, values[b], values[f]))
+                for c, (b, f) in enumerate(CLASS_PARAMS) if c != q_class]
+    bound, = [small if large == q else large for small, large in CONSTRAINTS if q in (small, large)]
+    critical = np.concatenate(critical + [fixed[bound][:, None]], axis=1)
+
+    # Grid values of q on both sides of every critical value (and on it, when
+    # it falls on the grid), and the grid ends
+    slots = np.searchsorted(grid, critical - 1e-9)[..., None] + np.arange(-1, 2)
+    chosen = np.zeros((len(win_low), len(grid)), dtype=bool)
+    rows = np.broadcast_to(np.arange(len(win_low))[:, None, None], slots.shape)
+    chosen[rows, np.clip(slots, 0, len(grid) - 1)] = True
+    chosen[:, [0, -1]] = True
+    rows, cols = np.nonzero(chosen)
+    lines = {p: values[rows] for p, values in fixed.items()}
+    lines[q] = grid[cols]
+    return lines
+
+def axis_extents(tau, axis_param, step=0.01, low=0.01, high=0.99, include_ties=False, batch_size=50_000):
+    # Per profile, inf/sup of axis_param over its equilibrium region, exact along
+    # axis_param, with the other three parameters on the np.arange grid
+    grid = np.arange(low, high + step / 2, step)
+    grid = grid[grid <= high + 1e-9]  # Steps that do not divide high - low stop short of high
+    lines = axis_lines(tau, axis_param, grid, low, high)
+    extents = np.full((len(PROFILES), 2), [np.inf, -np.inf])
+    for start in range(0, len(lines[FREE_PARAM[axis_param]]), batch_size):
+        fixed = {p: values[start:start + batch_size] for p, values in lines.items()}
+        starts, ends, masks = line_regions(tau, axis_param, fixed, low, high, include_ties)
+        used = ~np.isnan(starts)
+        for k in range(len(PROFILES)):
+            hits = used & ((masks >> k) & 1 == 1)
+            if hits.any():
+                extents[k, 0] = min(extents[k, 0], starts[hits].min())
+                extents[k, 1] = max(extents[k, 1], ends[hits].max())
+    return extents
+
+def parameter_ranges(tau, step=0.01, low=0.01, high=0.99, include_ties=False):
+    return {p: axis_extents(tau, p, step, low, high, include_ties) for p in PARAMS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equilibrium parameter ranges from the indifference surfaces")
+    parser.add_argument('--tau', type=float, default=0.001)
+    parser.add_argument('--step', type=float, default=0.01, help="Grid step of the parameters held fixed along each line")
+    parser.add_argument('--include-ties', action='store_true', help="Also count isolated points where two payoff classes tie")
+    args = parser.parse_args()
+
+    ranges = parameter_ranges(args.tau, args.step, include_ties=args.include_ties)
+    print("All Pure Strategy Equilibria:")
+    for k, eq in enumerate(PROFILES):
+        if not np.isfinite(ranges[PARAMS[0]][k, 0]):
+            continue
+        print(f"\nEquilibrium: {eq}")
+        print("Parameter Ranges:")
+        for p in PARAMS:
+            print(f"  {p}: [{ranges[p][k, 0]:.6f}, {ranges[p][k, 1]:.6f}]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import numpy as np
+from itertools import product
+
+# The point functions of the original sweep scripts (F, payoff, is_equilibrium,
+# find_equilibria and, from v3 on, process_params), loaded from their source
+# without running main(), which hardcodes full grids and output paths. Used as
+# the reference by the oracle and driven by the benchmarks.
+
+LEGACY = {
+    'v1': 'strategic_complexity_equilibrium-v1.py',
+    'v2': 'strategic_complexity_equilibrium-v2.py',
+    'v3': 'strategic_complexity_equilibrium-v3-parallel.py',
+    'v4': 'strategic_complexity_equilibrium-v4-parallel.py',
+    'v5': 'strategic_complexity_equilibrium-v5-parallel.py',
+}
+
+
+def load_legacy(version):
+    # Namespace holding the functions of one script
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), LEGACY[version])
+    with open(path) as f:
+        source = f.read()
+    namespace = {'np': np, 'product': product}
+    exec(source[source.index('def F('):source.index('def main(')], namespace)
+    return namespace
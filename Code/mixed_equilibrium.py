@@ -0,0 +1,143 @@
+import argparse
+from itertools import combinations
+import numpy as np
+from equilibrium_engine import STRATEGIES, payoff_matrix
+from parameter_grid import PARAMS
+
+# Mixed strategy solutions of the 4x4 zero-sum game at many points at once.
+# Player 1 (rows) maximizes and player 2 (columns) minimizes payoff(), so every
+# point has a value v and optimal mixed strategies p, q. By the Shapley-Snow
+# theorem some optimal pair is basic: it lives on a square support (rows I,
+# columns J) where p equalizes player 2's columns in J and q player 1's rows in
+# I. solve_zero_sum takes pure saddle points (1x1 supports) straight from the
+# matrices, then tries the larger square supports smallest first, solving the
+# equalizer systems of all still unsolved points in one batched np.linalg.solve
+# per support, and keeps the first support whose solution is a probability
+# vector no pure strategy beats.
+#
+# A support is coded in one byte: bit i for row i in I, bit 4 + j for column j
+# in J; support_solution re-solves points from their codes. 0 means no support
+# passed, which with tolerance 1e-9 should not happen.
+#
+# With the payoff classes of this model every weak ordering of the four class
+# payoffs has a pure saddle point, so every point has a pure equilibrium and the
+# solutions are 1x1 supports. The sweep (--mixed) solves the points whose mask is
+# 0 and counts them by support, which stays empty unless the model changes.
+
+TOLERANCE = 1e-9
+SUPPORTS = [(rows, cols) for k in range(1, len(STRATEGIES) + 1)
+            for rows in combinations(range(len(STRATEGIES)), k) for cols in combinations(range(len(STRATEGIES)), k)]
+NO_SUPPORT = 0
+
+
+def support_code(rows, cols):
+    return sum(1 << i for i in rows) | sum(1 << (len(STRATEGIES) + j) for j in cols)
+
+def support_sets(code):
+    n = len(STRATEGIES)
+    return [i for i in range(n) if code >> i & 1], [j for j in range(n) if code >> (n + j) & 1]
+
+def _equalizer(matrices):
+    # Solves p M = v 1, sum(p) = 1 for each (k, k) M; returns p, v and whether it is solvable
+    n, k = matrices.shape[0], matrices.shape[1]
+    system = np.zeros((n, k + 1, k + 1))
+    system[:, :k, :k] = np.swapaxes(matrices, 1, 2)
+    system[:, :k, k] = -1
+    system[:, k, :k] = 1
+    solvable = np.abs(np.linalg.det(system)) > TOLERANCE**2
+    system[~solvable] = np.eye(k + 1)
+    rhs = np.zeros((n, k + 1, 1))
+    rhs[:, k] = 1
+    solution = np.linalg.solve(system, rhs)[..., 0]
+    return solution[:, :k], solution[:, k], solvable
+
+def solve_support(matrices, rows, cols):
+    # Candidate (value, p, q, optimal) on one support for (n, 4, 4) matrices.
+    # Player 2's system is only solved where player 1's solution holds up.
+    n, size = len(matrices), matrices.shape[-1]
+    block = matrices[:, rows][:, :, cols]
+    p_rows, value, optimal = _equalizer(block)
+    p, q = np.zeros((n, size)), np.zeros((n, size))
+    p[:, rows] = p_rows
+    optimal &= (p >= -TOLERANCE).all(axis=1)
+    optimal &= ((p[:, :, None] * matrices).sum(axis=1) >= value[:, None] - TOLERANCE).all(axis=1)
+    candidates = np.flatnonzero(optimal)
+    q_cols, _, col_ok = _equalizer(np.swapaxes(block[candidates], 1, 2))
+    q[np.ix_(candidates, cols)] = q_cols
+    optimal[candidates] = (col_ok & (q[candidates] >= -TOLERANCE).all(axis=1)
+                           & ((matrices[candidates] * q[candidates, None, :]).sum(axis=2)
+                              <= value[candidates, None] + TOLERANCE).all(axis=1))
+    return value, np.clip(p, 0, None), np.clip(q, 0, None), optimal
+
+def solve_zero_sum(matrices):
+    # matrices (..., 4, 4) -> value (...), p (..., 4), q (..., 4), support code (...) uint8
+    matrices = np.asarray(matrices, dtype=float)
+    shape, size = matrices.shape[:-2], matrices.shape[-1]
+    matrices = matrices.reshape(-1, size, size)
+    value = np.full(len(matrices), np.nan)
+    p, q = np.zeros((len(matrices), size)), np.zeros((len(matrices), size))
+    support = np.full(len(matrices), NO_SUPPORT, dtype=np.uint8)
+
+    # 1x1 supports: the first pure saddle point, found without solving anything
+    saddle = ((matrices >= matrices.max(axis=1, keepdims=True))
+              & (matrices <= matrices.min(axis=2, keepdims=True))).reshape(len(matrices), -1)
+    pure = np.flatnonzero(saddle.any(axis=1))
+    i, j = np.divmod(saddle[pure].argmax(axis=1), size)
+    value[pure] = matrices[pure, i, j]
+    p[pure, i], q[pure, j] = 1, 1
+    support[pure] = (1 << i) | (1 << (size + j))
+
+    open_points = np.flatnonzero(~saddle.any(axis=1))
+    for rows, cols in SUPPORTS:
+        if len(open_points) == 0:
+            break
+        if len(rows) == 1:
+            continue
+        v, p_open, q_open, optimal = solve_support(matrices[open_points], list(rows), list(cols))
+        solved = open_points[optimal]
+        value[solved], p[solved], q[solved] = v[optimal], p_open[optimal], q_open[optimal]
+        support[solved] = support_code(rows, cols)
+        open_points = open_points[~optimal]
+    return value.reshape(shape), p.reshape(shape + (size,)), q.reshape(shape + (size,)), support.reshape(shape)
+
+def support_solution(matrices, codes):
+    # Re-solves points from their stored support codes
+    matrices = np.asarray(matrices, dtype=float).reshape(-1, 4, 4)
+    codes = np.asarray(codes).ravel()
+    value, p, q = np.full(len(codes), np.nan), np.zeros((len(codes), 4)), np.zeros((len(codes), 4))
+    for code in np.unique(codes[codes != NO_SUPPORT]):
+        rows = codes == code
+        value[rows], p[rows], q[rows], _ = solve_support(matrices[rows], *support_sets(int(code)))
+    return value, p, q
+
+
+def lattice_supports(taus, axis, indices, masks):
+    # Support codes of the lattice points without a pure equilibrium (masks == 0),
+    # NO_SUPPORT elsewhere; shape (n_tau, n_points) like masks
+    supports = np.zeros(masks.shape, dtype=np.uint8)
+    values = [axis[index] for index in indices]
+    for t, tau in enumerate(taus):
+        mixed = masks[t] == 0
+        if mixed.any():
+            supports[t, mixed] = solve_zero_sum(payoff_matrix(tau, *(value[mixed] for value in values)))[3]
+    return supports
+
+def support_label(code):
+    rows, cols = support_sets(code)
+    return f"{{{', '.join(STRATEGIES[i] for i in rows)}}} x {{{', '.join(STRATEGIES[j] for j in cols)}}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Value and optimal mixed strategies of the zero-sum game at one point")
+    parser.add_argument('--tau', type=float, default=0.001)
+    parser.add_argument('point', type=float, nargs=4, metavar=tuple(PARAMS))
+    args = parser.parse_args()
+
+    value, p, q, support = solve_zero_sum(payoff_matrix(args.tau, *args.point))
+    print(f"Value: {value}")
+    print(f"Support: {support_label(int(support))}")
+    print("Player 1: " + ', '.join(f"{s}={x:.6f}" for s, x in zip(STRATEGIES, p)))
+    print("Player 2: " + ', '.join(f"{s}={x:.6f}" for s, x in zip(STRATEGIES, q)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+# Lazy replacement for list(ParameterGrid(param_grid)) in the v3-v5 sweeps.
+# Points are integer indices into one shared axis, e.g. np.arange(0.01, 1.00, step),
+# and only those satisfying b_Cs > b_Ss and b_Cc > b_Sc are enumerated (like the
+# nested loops of v1/v2). With the same axis for all four parameters the
+# constraints are i_Cs > i_Ss and i_Cc > i_Sc.
+#
+# The constrained lattice is the product of two triangles of index pairs,
+# (i_Ss, i_Cs) and (i_Sc, i_Cc). Point t of the lattice is pair t // P of the
+# first triangle and pair t % P of the second, P = n(n-1)/2, so any range of t
+# can be generated independently of the others.
+#
+# Indices belong to one run's axis. To compare or join points across runs with
+# different steps, they are mapped to the absolute lattice: whole numbers of
+# 1/LATTICE_SCALE, so 0.01 is 100 units at any step. Floats are rebuilt from
+# indices (grid_axis(step)[i], the exact values the sweep used) only on output.
+
+PARAMS = ['b_Ss', 'b_Sc', 'b_Cs', 'b_Cc']  # Order of the lattice axes
+LATTICE_SCALE = 10_000  # Values in [0, 1] fit in uint16 units
+
+
+def grid_axis(step, start=0.01, stop=1.00):
+    return np.arange(start, stop, step)
+
+def index_dtype(n):
+    return np.uint8 if n <= np.iinfo(np.uint8).max + 1 else np.uint16
+
+def num_pairs(n):
+    return n * (n - 1) // 2
+
+def constrained_size(n):
+    return num_pairs(n) ** 2
+
+def constrained_pairs(n):
+    # All (i, j) with i < j, in row-major order
+    i, j = np.triu_indices(n, k=1)
+    return i.astype(index_dtype(n)), j.astype(index_dtype(n))
+
+def constrained_indices(n, start, stop, pairs=None):
+    # Lattice points start..stop-1 as (i_Ss, i_Sc, i_Cs, i_Cc)
+    return lattice_points(n, np.arange(start, stop, dtype=np.int64), pairs)
+
+def lattice_points(n, t, pairs=None):
+    # Lattice points at positions t (any order) as (i_Ss, i_Sc, i_Cs, i_Cc)
+    low, high = pairs if pairs is not None else constrained_pairs(n)
+    outer, inner = np.divmod(np.asarray(t, dtype=np.int64), num_pairs(n))
+    return low[outer], low[inner], high[outer], high[inner]
+
+def pair_position(n, i, j):
+    # Position of the pair (i, j), i < j, in constrained_pairs(n)
+    i, j = np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64)
+    return i * (2 * n - i - 1) // 2 + j - i - 1
+
+def lattice_position(n, i_Ss, i_Sc, i_Cs, i_Cc):
+    # Inverse of lattice_points
+    return pair_position(n, i_Ss, i_Cs) * num_pairs(n) + pair_position(n, i_Sc, i_Cc)
+
+def chunk_ranges(total, chunk_size):
+    for start in range(0, total, chunk_size):
+        yield start, min(start + chunk_size, total)
+
+def iter_constrained_grid(n, chunk_size=1_000_000):
+    # Memory stays at one chunk no matter how fine the axis is
+    pairs = constrained_pairs(n)
+    for start, stop in chunk_ranges(constrained_size(n), chunk_size):
+        yield constrained_indices(n, start, stop, pairs)
+
+def lattice_units(step, start=0.01):
+    # (start, step) in absolute lattice units
+    start_units, step_units = start * LATTICE_SCALE, step * LATTICE_SCALE
+    if not (np.isclose(start_units, round(start_units)) and np.isclose(step_units, round(step_units))):
+        raise ValueError(f"Grid start={start}, step={step} is not on the 1/{LATTICE_SCALE} lattice")
+    return round(start_units), round(step_units)
+
+def to_lattice(indices, step, start=0.01):
+    # Run indices -> absolute lattice units (uint16)
+    start_units, step_units = lattice_units(step, start)
+    return (start_units + np.asarray(indices, dtype=np.int64) * step_units).astype(np.uint16)
+
+def from_lattice(units, step, start=0.01):
+    # Absolute lattice units -> run indices; -1 where the point is not on this run's grid
+    start_units, step_units = lattice_units(step, start)
+    offset = np.asarray(units, dtype=np.int64) - start_units
+    index, rest = np.divmod(offset, step_units)
+    n = len(grid_axis(step, start))
+    return np.where((rest == 0) & (index >= 0) & (index < n), index, -1)
+
+def lattice_values(units):
+    # Decimal value of absolute lattice units, e.g. 100 -> 0.01
+    return np.asarray(units) / LATTICE_SCALE
@@ -0,0 +1,203 @@
+import gzip
+import json
+import os
+import queue
+import threading
+import numpy as np
+from equilibrium_engine import STRATEGIES
+from equilibrium_sweep import profile_points
+from parameter_grid import PARAMS, grid_axis, to_lattice, LATTICE_SCALE
+from sweep_profiler import stage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Export of the target equilibria off the compute path. The parent hands each
+# finished chunk's masks to put(); a writer thread turns them into rows and
+# writes them while the workers go on computing. The queue between the two is
+# bounded, so a slow disk holds the sweep back instead of piling up masks in
+# memory.
+#
+# Formats:
+#   csv, csv.gz, csv.zst  the CSV of v5 (same rows, same text)
+#   columns               a directory with one raw little-endian file per
+#                         column (strategies as indices into STRATEGIES, tau as
+#                         float64, b_* as uint16 absolute lattice units) and a
+#                         columns.json schema; read_columns() maps them
+#
+# sync() returns a position to resume from after a crash: the byte offset of
+# the (compressed) CSV, which is cut there at the end of a complete gzip member
+# or zstd frame, or the number of rows of the columns.
+
+FORMATS = ['csv', 'csv.gz', 'csv.zst', 'columns']
+CSV_HEADER = ['Player1_Strategy', 'Player2_Strategy', 'tau'] + PARAMS
+COLUMNS = {'player1': np.uint8, 'player2': np.uint8, 'tau': np.float64} | {p: np.uint16 for p in PARAMS}
+
+
+def output_path(csv_path, fmt):
+    # specific_equilibria_...csv -> ...csv.gz / ...columns
+    root, _ = os.path.splitext(csv_path)
+    return f'{root}.{fmt}'
+
+def check_format(fmt):
+    # Called by the sweep before it touches any output, so a bad format cannot
+    # leave a half-overwritten store behind
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt}, expected one of {FORMATS}")
+    if fmt == 'csv.zst' and zstandard is None:
+        raise ImportError("csv.zst output needs the zstandard package")
+
+def read_columns(path):
+    with open(os.path.join(path, 'columns.json')) as f:
+        schema = json.load(f)
+    return {name: np.fromfile(os.path.join(path, name), dtype=dtype) for name, dtype in schema['columns'].items()}
+
+
+class _CsvSink:
+    def __init__(self, path, fmt, offset, header):
+        self.fmt = fmt
+        self.raw = open(path, 'r+b' if offset is not None else 'wb')
+        if offset is not None:
+            self.raw.truncate(offset)
+            self.raw.seek(offset)
+        self.stream = None
+        if header and offset is None:
+            self.write([','.join(CSV_HEADER) + '\r\n'])
+
+    def write(self, lines):
+        if self.stream is None:
+            if self.fmt == 'csv.gz':
+                self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6)
+            elif self.fmt == 'csv.zst':
+                self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+            else:
+                self.stream = self.raw
+        self.stream.write(''.join(lines).encode())
+
+    def sync(self):
+        # Ends the current gzip member / zstd frame, so the file is valid up to here
+        if self.stream is not None and self.stream is not self.raw:
+            self.stream.close()
+            self.stream = None
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return self.raw.tell()
+
+    def close(self):
+        self.sync()
+        self.raw.close()
+
+
+class _ColumnSink:
+    def __init__(self, path, taus, offset):
+        os.makedirs(path, exist_ok=True)
+        schema = {
+            'columns': {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+            'strategies': STRATEGIES,
+            'taus': list(taus),
+            'lattice_scale': LATTICE_SCALE,
+        }
+        with open(os.path.join(path, 'columns.json'), 'w') as f:
+            json.dump(schema, f, indent=2)
+        self.files = {}
+        for name, dtype in COLUMNS.items():
+            file = open(os.path.join(path, name), 'r+b' if offset is not None else 'wb')
+            if offset is not None:
+                file.truncate(offset * np.dtype(dtype).itemsize)
+                file.seek(0, os.SEEK_END)
+            self.files[name] = file
+        self.rows = offset or 0
+
+    def write(self, columns):
+        for name, values in columns.items():
+            self.files[name].write(np.ascontiguousarray(values, dtype=COLUMNS[name]).tobytes())
+        self.rows += len(columns['tau'])
+
+    def sync(self):
+        for file in self.files.values():
+            file.flush()
+            os.fsync(file.fileno())
+        return self.rows
+
+    def close(self):
+        self.sync()
+        for file in self.files.values():
+            file.close()
+
+
+class ResultWriter:
+    # Background writer of the rows of target profiles; offset resumes an interrupted export
+    def __init__(self, path, fmt, taus, step, profiles, offset=None, header=True, max_pending=4):
+        check_format(fmt)
+        self.taus, self.step, self.profiles = list(taus), step, list(profiles)
+        self.columnar = fmt == 'columns'
+        self.sink = _ColumnSink(path, taus, offset) if self.columnar else _CsvSink(path, fmt, offset, header)
+        # Row text of every axis value and tau, as csv.writer writes them
+        self.axis_text = [str(float(value)) for value in grid_axis(step)]
+        self.units = to_lattice(np.arange(len(self.axis_text)), step)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.stages = {}  # Writer thread timings, see sweep_profiler.py
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _rows(self, start, stop, masks):
+        for t, tau in enumerate(self.taus):
+            for eq in self.profiles:
+                indices = profile_points(self.step, start, stop, masks[t], eq)
+                if len(indices[0]) == 0:
+                    continue
+                if self.columnar:
+                    n = len(indices[0])
+                    yield {'player1': np.full(n, STRATEGIES.index(eq[0])), 'player2': np.full(n, STRATEGIES.index(eq[1])),
+                           'tau': np.full(n, tau)} | {p: self.units[index] for p, index in zip(PARAMS, indices)}
+                else:
+                    prefix = f'{eq[0]},{eq[1]},{tau!r},'
+                    text = self.axis_text
+                    yield [f'{prefix}{text[a]},{text[b]},{text[c]},{text[d]}\r\n' for a, b, c, d in zip(*indices)]
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if self.error is None:
+                    if item[0] == 'chunk':
+                        with stage(self.stages, 'export'):
+                            for rows in self._rows(*item[1:]):
+                                self.sink.write(rows)
+                    elif item[0] == 'sync':
+                        with stage(self.stages, 'sync'):
+                            item[1].append(self.sink.sync())
+                    else:
+                        self.sink.close()
+                        return
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+            if item[0] == 'close':
+                return
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("Result writer failed") from self.error
+
+    def put(self, start, stop, masks):
+        # Blocks while max_pending chunks are waiting to be written
+        self._check()
+        self.queue.put(('chunk', start, stop, masks))
+
+    def sync(self):
+        # Waits until everything handed over is on disk; returns the resume offset
+        result = []
+        self.queue.put(('sync', result))
+        self.queue.join()
+        self._check()
+        return result[0]
+
+    def close(self):
+        self.queue.put(('close',))
+        self.thread.join()
+        self._check()
@@ -0,0 +1,222 @@
+# CHANGE FILE PATH!
+
+import argparse
+import os
+import time
+import multiprocessing as mp
+from tqdm import tqdm
+from equilibrium_engine import PROFILES, ENGINES
+from equilibrium_sweep import empty_summary, merge_summaries, sweep_tasks, iter_sweep, print_summary, tau_label
+from equilibrium_store import create_store, open_store, write_chunk, mark_complete, store_files, reuse_share, REUSE_MIN_SHARE
+from parameter_grid import grid_axis, lattice_units, constrained_size
+from sweep_profiler import stage, new_profile, record_chunk, maybe_sample, write_report
+from sweep_checkpoint import save_checkpoint, load_checkpoint
+from sweep_cache import sweep_key, cache_lookup, restore_entry, cache_put
+from result_writer import ResultWriter, FORMATS, check_format, output_path
+from sweep_shards import parse_shard, shard_suffix, shard_chunks, shard_csv_path, create_shard, write_shard_chunk, finish_shard
+from equilibrium_index import build_index, index_files
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pure strategy equilibria over the (b_Ss, b_Sc, b_Cs, b_Cc) grid")
+    parser.add_argument('--tau', type=float, nargs='+', default=[0.001], help="One or more taus, swept together in one pass")
+    parser.add_argument('--step', type=float, default=0.01)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='separable')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000, help="Adjust this value based on your available memory (it scales with the number of taus)")
+    parser.add_argument('--no-store', action='store_true', help="Skip the memory-mapped bitmask store (see equilibrium_store.py)")
+    parser.add_argument('--no-csv', action='store_true', help="Skip the CSV export of the target equilibria")
+    parser.add_argument('--csv-format', choices=FORMATS, default='csv', help="Plain, gzip or zstd CSV, or binary columns (see result_writer.py)")
+    parser.add_argument('--resume', action='store_true', help="Skip chunks finished by an interrupted run with the same settings")
+    parser.add_argument('--reuse', nargs='+', default=[], metavar='STORE', help="Copy the points these finished stores already hold (e.g. a coarser step) instead of recomputing them")
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N', help="Only run shard i of N (0-based); combine the shards with sweep_shards.py")
+    parser.add_argument('--cache-dir', default='sweep_cache', help="Finished sweeps are cached here and identical reruns are served from it")
+    parser.add_argument('--cache-size', type=float, default=20, help="Cache size bound in GB; least recently used sweeps are evicted")
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--profile', metavar='FILE', help="Write stage timings, counters and pool idle time to this JSON file (see sweep_profiler.py)")
+    parser.add_argument('--profile-every', type=float, metavar='SECONDS', help="Also sample the profile this often during the run")
+    parser.add_argument('--mixed', action='store_true', help="Solve points without a pure equilibrium for mixed equilibria (see mixed_equilibrium.py)")
+    parser.add_argument('--index', action='store_true', help="Build the query index over the finished store (see equilibrium_index.py)")
+    parser.add_argument('--checkpoint-every', type=int, default=1, help="Checkpoint after this many chunks")
+    return parser.parse_args()
+
+
+def run_sweep(args, taus, step, store_path, desired_file_path, target_equilibria):
+    write_store, write_csv = not args.no_store, not args.no_csv
+    csv_path = shard_csv_path(desired_file_path, *args.shard, args.csv_format) if args.shard else desired_file_path
+
+    # The checkpoint is only valid for a rerun of exactly the same sweep
+    config = {'taus': taus, 'step': step, 'engine': args.engine, 'chunk_size': args.chunk_size,
+              'store': write_store, 'csv': write_csv, 'csv_format': args.csv_format, 'reuse': args.reuse}
+    if args.mixed:
+        config['mixed'] = True
+    checkpoint = load_checkpoint(store_path, config) if args.resume else None
+    if checkpoint:
+        done, summary, csv_offset = checkpoint
+        print(f"Resuming: {len(done)} chunks already finished")
+    else:
+        done, summary, csv_offset = set(), empty_summary(len(taus)), None
+
+    num_cores = max(1, mp.cpu_count()-4)
+    profile = new_profile(config, num_cores, args.profile, args.profile_every)
+    with stage(profile['parent'], 'tasks'):
+        tasks = sweep_tasks(taus, step, args.engine, args.chunk_size, keep_masks=write_csv or write_store,
+                            reuse=args.reuse, mixed=args.mixed)
+    chunk_ids = range(len(tasks))
+    if args.shard:
+        chunk_ids = shard_chunks(len(tasks), *args.shard)
+        if not chunk_ids:
+            raise ValueError(f"Shard {args.shard[0]}/{args.shard[1]} is empty: {len(tasks)} chunks for {args.shard[1]} shards; use a smaller --chunk-size")
+        shard_start, shard_stop = tasks[chunk_ids[0]][2], tasks[chunk_ids[-1]][3]
+    tasks = [tasks[chunk_id] for chunk_id in chunk_ids if chunk_id not in done]
+
+    # Set up multiprocessing
+    print(num_cores)
+    pool = mp.Pool(num_cores)
+    profile['pool_started'] = time.time()
+
+    store = None
+    if write_store and checkpoint:
+        store = open_store(store_path, 'r+')[0]
+    elif write_store and args.shard:
+        store = create_shard(store_path, taus, step, args.shard, shard_start, shard_stop, config,
+                             desired_file_path if write_csv else None, args.csv_format)
+    elif write_store:
+        store = create_store(store_path, taus, step)
+
+    writer = None
+    if write_csv:
+        # On resume, rows written after the last checkpoint are dropped; they are recomputed.
+        # Only the first shard writes the header, so shard outputs concatenate.
+        resume_offset = csv_offset if checkpoint and os.path.exists(csv_path) else None
+        writer = ResultWriter(csv_path, args.csv_format, taus, step, target_equilibria, resume_offset,
+                              header=not args.shard or args.shard[0] == 0)
+
+    def checkpoint_now():
+        if store is not None:
+            store.flush()
+        offset = writer.sync() if writer else None
+        save_checkpoint(store_path, config, done, summary, offset)
+
+    # Each worker reduces its chunk; the parent only merges the summaries
+    results = iter_sweep(pool, tasks)
+    for _ in tqdm(range(len(tasks))):
+        with stage(profile['parent'], 'wait'):
+            start, stop, chunk_summary, masks, stats = next(results)
+        record_chunk(profile, stats)
+        with stage(profile['parent'], 'merge'):
+            merge_summaries(summary, chunk_summary)
+        with stage(profile['parent'], 'store'):
+            if store is not None and args.shard:
+                write_shard_chunk(store, shard_start, start, stop, masks)
+            elif store is not None:
+                write_chunk(store, start, stop, masks)
+        if writer:
+            # Rows are written on the writer thread while the workers carry on
+            with stage(profile['parent'], 'export'):
+                writer.put(start, stop, masks)
+        done.add(start // args.chunk_size)
+        if len(done) % args.checkpoint_every == 0:
+            with stage(profile['parent'], 'checkpoint'):
+                checkpoint_now()
+        maybe_sample(profile, writer.stages if writer else None)
+    with stage(profile['parent'], 'checkpoint'):
+        checkpoint_now()
+
+    # Close the pool
+    pool.close()
+    pool.join()
+
+    if writer:
+        with stage(profile['parent'], 'finish_export'):
+            writer.close()
+    if store is not None and args.shard:
+        finish_shard(store_path, summary)
+    elif store is not None:
+        mark_complete(store_path)
+    if args.profile:
+        write_report(profile, writer.stages if writer else None)
+        print(f"Profile report has been written to '{args.profile}'")
+    return summary
+
+
+def main():
+    args = parse_args()
+    taus, step = args.tau, args.step
+    write_store, write_csv = not args.no_store, not args.no_csv
+    lattice_units(step)  # Fail early if the grid is not on the shared lattice
+    if write_csv:
+        check_format(args.csv_format)  # Fail before the store of an earlier run is recreated
+
+    # CHANGE FILE PATH
+    desired_file_path = output_path(f'specific_equilibria_{tau_label(taus)}_step_{step}.csv', args.csv_format)
+    store_path = f'equilibria_{tau_label(taus)}_step_{step}'
+
+    if store_path in args.reuse:
+        raise ValueError(f"Cannot reuse '{store_path}' while overwriting it")
+    for path in args.reuse:
+        share = reuse_share(path, step)
+        if share < REUSE_MIN_SHARE:
+            print(f"Not reusing '{path}': it holds {share:.1%} of the points, recomputing them is faster")
+    if args.shard:
+        if not write_store:
+            raise ValueError("--shard needs the store: the merge rebuilds the full store from the shard stores")
+        merged_store_path = store_path
+        store_path += shard_suffix(*args.shard)
+
+    target_equilibria = [('CC', 'SS'), ('CS', 'SS'), ('CC', 'CS'), ('SC', 'CS'), ('CS', 'CS')]
+
+    # Cached files by name; what is in them only depends on the cache key
+    outputs = {}
+    if write_store:
+        outputs['store.npy'], outputs['store.json'] = store_files(store_path)
+    if write_csv:
+        outputs[f'equilibria.{args.csv_format}'] = desired_file_path
+
+    entry = key = None
+    if not args.no_cache and not args.shard:
+        key = sweep_key({'taus': taus, 'step': step, 'start': 0.01, 'stop': 1.00,
+                         'constraints': ['b_Cs > b_Ss', 'b_Cc > b_Sc'],
+                         'csv_profiles': [list(eq) for eq in target_equilibria]}
+                        | ({'mixed': True} if args.mixed else {}))
+        entry = cache_lookup(args.cache_dir, key, outputs)
+    if entry:
+        print(f"Identical sweep found in the cache ({entry})")
+        if args.profile or args.profile_every:
+            print("Profiling skipped: nothing was computed, the sweep came from the cache (use --no-cache to profile it)")
+        summary = restore_entry(entry, outputs)
+        summary['evaluated'][:] = 0
+    else:
+        summary = run_sweep(args, taus, step, store_path, desired_file_path, target_equilibria)
+        if key:
+            cache_put(args.cache_dir, key, summary, outputs, args.cache_size * 1e9)
+
+    print_summary(summary, taus, step, args.mixed)
+    if args.reuse:
+        total = constrained_size(len(grid_axis(step)))
+        for t, tau in enumerate(taus):
+            print(f"Reused {total - summary['evaluated'][t]} of {total} points (tau={tau})")
+
+    # Check if (CC, SS) or equivalent payoff equilibrium exists
+    for t, tau in enumerate(taus):
+        for eq in target_equilibria:
+            if summary['count'][t, PROFILES.index(eq)] > 0:
+                print(f"\n{eq} is an equilibrium in some parameter ranges (tau={tau}).")
+            else:
+                print(f"\n{eq} never occurs as an equilibrium (tau={tau}).")
+
+    if args.shard:
+        print(f"Shard {args.shard[0]}/{args.shard[1]} has been written to '{store_path}.npy'; "
+              f"once all shards are done, run: python sweep_shards.py {merged_store_path} {args.shard[1]}")
+        return
+
+    if write_store:
+        print(f"Equilibrium bitmask store has been written to '{store_path}.npy'")
+        if args.index:
+            build_index(store_path)
+            print(f"Query index has been written to '{index_files(store_path)[0]}'")
+
+    if write_csv:
+        print(f"Specific equilibria data has been written to '{desired_file_path}'")
+
+if __name__ == "__main__":
+    main()
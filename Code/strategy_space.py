@@ -0,0 +1,196 @@
+import argparse
+import json
+from itertools import product
+import numpy as np
+from equilibrium_engine import class_payoffs
+from game_dynamics_batch import ACTIONS, CLASS_ACTIONS, CYCLE_CLASSES
+from parameter_grid import PARAMS
+
+# Memory-k strategies. A strategy answers the last k actions of the game
+# (oldest first, 'S' before the game starts) with an action, so it is a table of
+# 2^k actions and there are 2^(2^k) of them; memory_strategies(1) is STRATEGIES.
+# Strategies are written as their tables: position h answers the history whose
+# bits (S = 0, C = 1, oldest most significant) spell h.
+#
+# build_space(k) plays every profile through the product automaton -- state
+# (last k actions, player to move), 2^(k+1) states, player 1 moving first from
+# state 'S' as in game_dynamics_batch.py -- and reads off the cycle it ends in.
+# A profile's payoff class is the mix of (player 1 action, player 2 answer) pairs
+# around that cycle: a cycle that stays on one pair pays that pair's payoff()
+# class, one that runs through several pays the class the model assigns it by
+# hand (CYCLE_CLASSES). payoff() does not define any other multi-pair cycle, so,
+# as in profile_classes, such a cycle is an error; with average_cycles it pays
+# the mean over the cycle instead (the long-run payoff per round), and its class
+# is marked as averaged. Every k >= 2 space has such cycles, so it needs
+# average_cycles or more CYCLE_CLASSES entries; the command line averages for
+# k >= 2 unless told otherwise. Profiles with the same mix share a class, and strategies
+# whose rows (player 1) or columns (player 2) of the class table are identical
+# are interchangeable, so the saddle point search runs on the reduced table of
+# distinct rows and columns. For k = 1 this is exactly PROFILE_CLASS.
+#
+#   python strategy_space.py --memory 2 --tau 0.001 --point 0.2 0.3 0.6 0.7
+
+# CLASS_ACTIONS index of (player 1 action, player 2 answer)
+PAIR_CLASS = np.array([[CLASS_ACTIONS.index(a + b) for b in ACTIONS] for a in ACTIONS], dtype=np.intp)
+
+
+def memory_strategies(k):
+    return [''.join(actions) for actions in product(ACTIONS, repeat=2**k)]
+
+def strategy_tables(strategies):
+    return np.array([[ACTIONS.index(action) for action in strategy] for strategy in strategies], dtype=np.int8)
+
+
+def simulate_profiles(tables, k, player1, player2):
+    # Action sequences of the runs and where their cycles start and end
+    histories, states = 2**k, 2**(k + 1)
+    runs, steps = len(player1), 2 * states + 2
+    rows = np.arange(runs)
+    history = np.zeros(runs, dtype=np.intp)
+    sequence = np.zeros((runs, steps + 1), dtype=np.int8)
+    first_seen = np.full((runs, states), -1, dtype=np.intp)
+    cycle_start = np.full(runs, -1, dtype=np.intp)
+    cycle_stop = np.full(runs, -1, dtype=np.intp)
+    for t in range(steps):
+        state = history + histories * (t % 2)
+        seen = first_seen[rows, state]
+        closing = (cycle_stop < 0) & (seen >= 0)
+        cycle_start[closing], cycle_stop[closing] = seen[closing], t
+        first_seen[rows, state] = np.where(seen >= 0, seen, t)
+        action = tables[player1 if t % 2 == 0 else player2, history]
+        history = ((history << 1) | action) & (histories - 1)
+        sequence[:, t + 1] = action
+    return sequence, cycle_start, cycle_stop - cycle_start
+
+def cycle_pair_counts(sequence, prefix_length, cycle_length):
+    # How often each CLASS_ACTIONS pair comes up once around the cycle, and the
+    # pairs themselves in cycle order (-1 padded); player 1 moves from even states
+    width = np.arange(sequence.shape[1] // 4)
+    moves = 2 * (prefix_length[:, None] // 2 + width) + 1
+    moves = np.minimum(moves, sequence.shape[1] - 2)
+    pairs = PAIR_CLASS[np.take_along_axis(sequence, moves, 1), np.take_along_axis(sequence, moves + 1, 1)]
+    pairs = np.where(width < cycle_length[:, None] // 2, pairs, -1)
+    counts = np.stack([(pairs == c).sum(axis=1) for c in range(len(CLASS_ACTIONS))], axis=1)
+    return counts, pairs
+
+def _cycle_key(pairs):
+    names = [CLASS_ACTIONS[c] for c in pairs if c >= 0]
+    return min(tuple(names[r:] + names[:r]) for r in range(len(names)))
+
+def build_space(k, cycle_classes=CYCLE_CLASSES, average_cycles=False):
+    strategies = memory_strategies(k)
+    n = len(strategies)
+    player1, player2 = np.divmod(np.arange(n * n), n)
+    sequence, prefix_length, cycle_length = simulate_profiles(strategy_tables(strategies), k, player1, player2)
+    counts, pairs = cycle_pair_counts(sequence, prefix_length, cycle_length)
+
+    # Hand-assigned cycles count as their class only; other multi-pair cycles
+    # keep their mix only if averaging was asked for
+    cycles, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    for c, cycle in enumerate(cycles):
+        key = _cycle_key(cycle)
+        if len(set(key)) > 1 and key not in cycle_classes and not average_cycles:
+            run = np.flatnonzero(inverse.ravel() == c)[0]
+            profile = (strategies[player1[run]], strategies[player2[run]])
+            raise ValueError(f"Profile {profile} cycles through {key}; it needs an entry in cycle_classes "
+                             f"(or average_cycles to pay the mean over the cycle)")
+        if key in cycle_classes:
+            assigned = np.zeros(len(CLASS_ACTIONS), dtype=counts.dtype)
+            assigned[CLASS_ACTIONS.index(cycle_classes[key])] = 1
+            counts[inverse.ravel() == c] = assigned
+    counts //= np.gcd.reduce(counts, axis=1)[:, None]
+
+    # Single-pair classes first, in CLASS_ACTIONS order
+    mixes, profile_class = np.unique(counts, axis=0, return_inverse=True)
+    order = sorted(range(len(mixes)), key=lambda c: (np.count_nonzero(mixes[c]) > 1, int(mixes[c].argmax()), tuple(mixes[c])))
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    class_table = rank[profile_class.ravel()].reshape(n, n)
+
+    rows, row_group = np.unique(class_table, axis=0, return_inverse=True)
+    _, col_group = np.unique(class_table, axis=1, return_inverse=True)
+    row_reps = np.array([np.flatnonzero(row_group.ravel() == g)[0] for g in range(len(rows))])
+    col_reps = np.array([np.flatnonzero(col_group.ravel() == g)[0] for g in range(col_group.max() + 1)])
+    return {
+        'k': k,
+        'strategies': strategies,
+        'class_table': class_table,
+        'class_counts': mixes[order],
+        'averaged': np.count_nonzero(mixes[order], axis=1) > 1,
+        'distinct_cycles': len(cycles),
+        'row_group': row_group.ravel(),
+        'col_group': col_group.ravel(),
+        'reduced_table': class_table[np.ix_(row_reps, col_reps)],
+    }
+
+
+def class_values(space, tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    # Shape (..., n_classes)
+    payoffs = class_payoffs(tau, b_Ss, b_Sc, b_Cs, b_Cc)[..., None, :]
+    counts = space['class_counts']
+    return (payoffs * counts).sum(axis=-1) / counts.sum(axis=-1)
+
+def reduced_saddle_points(space, tau, b_Ss, b_Sc, b_Cs, b_Cc):
+    # Boolean (..., row groups, column groups): saddle points of the reduced game
+    matrix = class_values(space, tau, b_Ss, b_Sc, b_Cs, b_Cc)[..., space['reduced_table']]
+    return (matrix >= matrix.max(axis=-2, keepdims=True)) & (matrix <= matrix.min(axis=-1, keepdims=True))
+
+def saddle_profiles(space, saddle):
+    # Profiles behind one point's reduced saddle points
+    profiles = []
+    for r, c in zip(*np.nonzero(saddle)):
+        for i in np.flatnonzero(space['row_group'] == r):
+            for j in np.flatnonzero(space['col_group'] == c):
+                profiles.append((space['strategies'][i], space['strategies'][j]))
+    return profiles
+
+
+def space_summary(space):
+    n = len(space['strategies'])
+    return {
+        'k': space['k'],
+        'strategies': n,
+        'profiles': n * n,
+        'distinct_cycles': space['distinct_cycles'],
+        'payoff_classes': len(space['class_counts']),
+        'averaged_classes': np.flatnonzero(space['averaged']).tolist(),
+        'reduced_game': list(space['reduced_table'].shape),
+        'class_mixes': [dict(zip(CLASS_ACTIONS, map(int, counts))) for counts in space['class_counts']],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Payoff classes and equilibria of memory-k strategy spaces")
+    parser.add_argument('--memory', type=int, default=2, help="k, the number of past actions strategies see")
+    parser.add_argument('--tau', type=float, default=0.001)
+    parser.add_argument('--point', type=float, nargs=4, metavar=tuple(PARAMS), help="Print the equilibria at this point")
+    parser.add_argument('--average-cycles', action=argparse.BooleanOptionalAction,
+                        help="Pay multi-pair cycles without a CYCLE_CLASSES entry the mean over the cycle "
+                             "(default: on for --memory 2 and up, which have such cycles)")
+    parser.add_argument('--limit', type=int, default=20, help="Most equilibrium profiles to print")
+    parser.add_argument('--output', help="Write the space summary and class table to this JSON file")
+    args = parser.parse_args()
+
+    average_cycles = args.memory > 1 if args.average_cycles is None else args.average_cycles
+    try:
+        space = build_space(args.memory, average_cycles=average_cycles)
+    except ValueError as error:
+        parser.error(f"{error}; on the command line that is --average-cycles")
+    summary = space_summary(space)
+    print(f"Memory {args.memory}: {summary['strategies']} strategies, {summary['profiles']} profiles, "
+          f"{summary['distinct_cycles']} distinct cycles, {summary['payoff_classes']} payoff classes "
+          f"({len(summary['averaged_classes'])} averaged over their cycle), "
+          f"reduced game {summary['reduced_game'][0]}x{summary['reduced_game'][1]}")
+    if args.point:
+        profiles = saddle_profiles(space, reduced_saddle_points(space, args.tau, *args.point))
+        print(f"{len(profiles)} equilibria at tau={args.tau}, " + ', '.join(f"{p}={v}" for p, v in zip(PARAMS, args.point)))
+        index = {strategy: i for i, strategy in enumerate(space['strategies'])}
+        for profile in profiles[:args.limit]:
+            averaged = space['averaged'][space['class_table'][index[profile[0]], index[profile[1]]]]
+            print(f"  {profile}" + (" (averaged cycle payoff)" if averaged else ""))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary | {'strategy_names': space['strategies'], 'class_table': space['class_table'].tolist()}, f)
+        print(f"Strategy space has been written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from equilibrium_engine import PAYOFF_MODEL_VERSION
+from equilibrium_sweep import summary_to_json, summary_from_json
+
+# Content-addressed cache of finished sweeps. An entry is a directory named by
+# the SHA-256 of the sweep configuration (taus, grid, constraints, exported
+# profiles) and PAYOFF_MODEL_VERSION, holding the merged summary and copies of
+# the output files. Entries are written to a temporary directory and renamed
+# into place, so readers never see half of one. The total size is bounded:
+# when it is exceeded the least recently used entries are removed.
+#
+#   key = sweep_key(config)
+#   entry = cache_lookup(cache_dir, key, ['store.npy'])
+#   summary = restore_entry(entry, {'store.npy': 'equilibria_tau_0.001_step_0.01.npy'})
+
+SUMMARY_FILE = 'summary.json'
+USED_FILE = 'last_used'  # Its mtime is the entry's LRU timestamp
+
+
+def sweep_key(config):
+    # Engine, chunk size, reuse and the like do not change results and belong outside config
+    state = {'config': config, 'payoff_model': PAYOFF_MODEL_VERSION}
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+def _touch(entry):
+    used = os.path.join(entry, USED_FILE)
+    open(used, 'a').close()
+    os.utime(used)
+
+def cache_lookup(cache_dir, key, files=()):
+    # Entry directory if the sweep is cached with all the given files, else None
+    entry = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(entry, SUMMARY_FILE)):
+        return None
+    if not all(os.path.exists(os.path.join(entry, name)) for name in files):
+        return None
+    _touch(entry)
+    return entry
+
+def _copy(source, destination):
+    if os.path.isdir(source):
+        shutil.copytree(source, destination, dirs_exist_ok=True)
+    else:
+        shutil.copyfile(source, destination)
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(_size(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+def restore_entry(entry, outputs):
+    # Copies the cached files to outputs (name -> destination) and returns the summary
+    for name, destination in outputs.items():
+        _copy(os.path.join(entry, name), destination)
+    with open(os.path.join(entry, SUMMARY_FILE)) as f:
+        return summary_from_json(json.load(f))
+
+def entry_size(entry):
+    return _size(entry)
+
+def cache_put(cache_dir, key, summary, outputs, max_bytes):
+    # Adds a finished sweep (outputs: name -> source file or directory), then evicts down to
+    # max_bytes. Returns the entry, or None if the sweep alone exceeds the bound.
+    if sum(_size(source) for source in outputs.values()) > max_bytes:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-')
+    for name, source in outputs.items():
+        _copy(source, os.path.join(tmp, name))
+    with open(os.path.join(tmp, SUMMARY_FILE), 'w') as f:
+        json.dump(summary_to_json(summary), f)
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        # Same results; keep the outputs an earlier run cached and this one did not write
+        for name in set(os.listdir(entry)) - set(outputs) - {SUMMARY_FILE, USED_FILE}:
+            os.replace(os.path.join(entry, name), os.path.join(tmp, name))
+    _touch(tmp)
+    shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # Another process cached the same sweep first
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict(cache_dir, max_bytes, keep=[key])
+    return entry
+
+def evict(cache_dir, max_bytes, keep=()):
+    # Removes least recently used entries until the cache fits in max_bytes
+    entries = []
+    for key in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, key)
+        if key.startswith('.') or not os.path.isdir(entry):
+            continue
+        try:
+            used = os.path.getmtime(os.path.join(entry, USED_FILE))
+            entries.append((used, key, entry_size(entry)))
+        except FileNotFoundError:
+            continue  # Removed or replaced by another process meanwhile
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for used, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total -= size
+        removed.append(key)
+    return removed
@@ -0,0 +1,37 @@
+import json
+import os
+from equilibrium_sweep import summary_to_json, summary_from_json
+
+# Chunk-level checkpoints for long sweeps. A checkpoint holds the sweep
+# configuration, the IDs of the finished chunks, the merged summary of those
+# chunks and how far the CSV export had got. It is rewritten atomically
+# (temporary file + os.replace), so a crash leaves either the old or the new one.
+
+
+def checkpoint_file(path):
+    return f'{path}.checkpoint.json'
+
+def save_checkpoint(path, config, done, summary, csv_offset=None):
+    state = {
+        'config': config,
+        'done': sorted(done),
+        'summary': summary_to_json(summary),
+        'csv_offset': csv_offset,
+    }
+    target = checkpoint_file(path)
+    tmp = f'{target}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, target)
+
+def load_checkpoint(path, config):
+    # Returns (done chunk IDs, summary, csv_offset), or None if there is no checkpoint
+    if not os.path.exists(checkpoint_file(path)):
+        return None
+    with open(checkpoint_file(path)) as f:
+        state = json.load(f)
+    if state['config'] != config:
+        raise ValueError(f"Checkpoint {checkpoint_file(path)} was written by a different sweep: {state['config']}")
+    return set(state['done']), summary_from_json(state['summary']), state['csv_offset']
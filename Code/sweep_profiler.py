@@ -0,0 +1,138 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Where a sweep spends its time. Stages are timed with wall and CPU clocks
+# into plain dicts ({stage: [wall, cpu, calls]}):
+#
+#   workers  indices, reuse, engine, summarize  -- per chunk, sent back with the result
+#   parent   tasks, wait (blocked on the pool), queued (wall time from a worker
+#            finishing a chunk to the parent taking it: pickling, the result pipe
+#            and results piling up while the parent is busy), merge, store,
+#            export (hand-off to the writer), checkpoint
+#   writer   export, sync  -- on the writer thread (result_writer.py)
+#
+# plus counters (points, evaluated, class payoff evaluations, equilibrium
+# checks = 16 profile tests per point and tau), per-worker histograms of chunk
+# latency, and pool idle time: how long each worker sat without a chunk while
+# the sweep ran. profile_report() puts it all in one JSON-able dict;
+# maybe_sample() appends a snapshot every so many seconds and rewrites the
+# report, so a long run can be watched from outside.
+
+# Upper bucket edges of the latency histograms, in milliseconds; the last bucket is open
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+@contextmanager
+def stage(stages, name, cpu_clock=time.thread_time):
+    wall, cpu = time.perf_counter(), cpu_clock()
+    try:
+        yield
+    finally:
+        entry = stages.setdefault(name, [0.0, 0.0, 0])
+        entry[0] += time.perf_counter() - wall
+        entry[1] += cpu_clock() - cpu
+        entry[2] += 1
+
+def merge_stages(total, stages):
+    for name, (wall, cpu, calls) in stages.items():
+        entry = total.setdefault(name, [0.0, 0.0, 0])
+        entry[0] += wall
+        entry[1] += cpu
+        entry[2] += calls
+    return total
+
+def stages_report(stages):
+    return {name: {'wall_seconds': wall, 'cpu_seconds': cpu, 'calls': calls} for name, (wall, cpu, calls) in stages.items()}
+
+def latency_bucket(seconds):
+    milliseconds = seconds * 1000
+    for k, edge in enumerate(LATENCY_BUCKETS_MS):
+        if milliseconds <= edge:
+            return k
+    return len(LATENCY_BUCKETS_MS)
+
+
+def new_profile(config, num_workers, path=None, every=None):
+    return {
+        'config': config,
+        'num_workers': num_workers,
+        'path': path,
+        'every': every,
+        'started': time.time(),
+        'pool_started': None,
+        'parent': {},
+        'worker_stages': {},
+        'counts': {},
+        'workers': {},
+        'samples': [],
+        'last_sample': (time.time(), 0),
+    }
+
+def record_chunk(profile, stats):
+    # stats come from sweep_chunk; received is stamped here, in the parent
+    received = time.time()
+    merge_stages(profile['worker_stages'], stats['stages'])
+    for name, value in stats['counts'].items():
+        profile['counts'][name] = profile['counts'].get(name, 0) + value
+    profile['counts']['chunks'] = profile['counts'].get('chunks', 0) + 1
+    entry = profile['parent'].setdefault('queued', [0.0, 0.0, 0])
+    entry[0] += received - stats['finished']
+    entry[2] += 1
+    worker = profile['workers'].setdefault(stats['pid'], {
+        'chunks': 0, 'busy_seconds': 0.0, 'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)})
+    latency = stats['finished'] - stats['started']
+    worker['chunks'] += 1
+    worker['busy_seconds'] += latency
+    worker['latency_histogram'][latency_bucket(latency)] += 1
+
+def profile_report(profile, writer_stages=None):
+    now = time.time()
+    span = now - (profile['pool_started'] or profile['started'])
+    busy = sum(worker['busy_seconds'] for worker in profile['workers'].values())
+    idle = max(0.0, profile['num_workers'] * span - busy)
+    return {
+        'config': profile['config'],
+        'wall_seconds': now - profile['started'],
+        'parent_stages': stages_report(profile['parent']),
+        'worker_stages': stages_report(profile['worker_stages']),
+        'writer_stages': stages_report(writer_stages or {}),
+        'counts': profile['counts'],
+        'pool': {
+            'workers': profile['num_workers'],
+            'span_seconds': span,
+            'busy_seconds': busy,
+            'idle_seconds': idle,
+            'idle_fraction': idle / (profile['num_workers'] * span) if span > 0 else 0.0,
+        },
+        'latency_buckets_ms': LATENCY_BUCKETS_MS,
+        'workers': {str(pid): worker for pid, worker in profile['workers'].items()},
+        'samples': profile['samples'],
+    }
+
+def write_report(profile, writer_stages=None):
+    if profile['path']:
+        tmp = f"{profile['path']}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(profile_report(profile, writer_stages), f, indent=2)
+        os.replace(tmp, profile['path'])
+
+def maybe_sample(profile, writer_stages=None):
+    # Called after every chunk; samples at most once per profile['every'] seconds
+    if not profile['every']:
+        return
+    now = time.time()
+    last_time, last_points = profile['last_sample']
+    if now - last_time < profile['every']:
+        return
+    points = profile['counts'].get('points', 0)
+    profile['samples'].append({
+        'elapsed_seconds': now - profile['started'],
+        'chunks': profile['counts'].get('chunks', 0),
+        'points': points,
+        'points_per_second': (points - last_points) / (now - last_time),
+        'parent_wait_seconds': profile['parent'].get('wait', [0.0])[0],
+    })
+    profile['last_sample'] = (now, points)
+    write_report(profile, writer_stages)
@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+from equilibrium_sweep import merge_summaries, print_summary, summary_to_json, summary_from_json
+from equilibrium_store import store_files, create_store, write_chunk, mark_complete, open_store
+from parameter_grid import grid_axis, constrained_size
+from sweep_checkpoint import checkpoint_file
+from result_writer import COLUMNS
+
+# Splitting one sweep across machines. With --shard i/N the v6 script only runs
+# chunks [C*i//N, C*(i+1)//N) of the C chunks of the constrained lattice, so
+# shards are contiguous, differ by at most one chunk and depend on nothing but
+# (i, N, chunk size). Each shard writes
+#
+#   <store>.shard-i-of-N.npy/.json   masks of its lattice range, (n_tau, stop - start)
+#   <csv>.shard-i-of-N.<format>      its rows of the export (see result_writer.py)
+#
+# and the sidecar gets the shard's summary once it is finished. merge_shards
+# turns the N shards back into the store, CSV and summary a single run makes:
+#
+#   python sweep_shards.py equilibria_tau_0.001_step_0.01 4
+
+
+def parse_shard(spec):
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard {spec} is not of the form i/N with 0 <= i < N")
+    return index, count
+
+def shard_suffix(index, count):
+    return f'.shard-{index}-of-{count}'
+
+def shard_chunks(num_chunks, index, count):
+    # Chunk IDs of one shard
+    return range(num_chunks * index // count, num_chunks * (index + 1) // count)
+
+def shard_csv_path(csv_path, index, count, fmt='csv'):
+    # ...step_0.01.csv.gz -> ...step_0.01.shard-i-of-N.csv.gz
+    return csv_path[:-len(fmt) - 1] + shard_suffix(index, count) + '.' + fmt
+
+def create_shard(path, taus, step, shard, start, stop, config, csv_path=None, csv_format='csv'):
+    # csv_path is the merged export; the shard writes shard_csv_path(csv_path, ...)
+    masks_file, meta_file = store_files(path)
+    meta = {
+        'taus': list(taus),
+        'step': step,
+        'shard': list(shard),
+        'start': start,
+        'stop': stop,
+        'shape': [len(taus), stop - start],
+        'config': config,
+        'csv': csv_path,
+        'csv_format': csv_format,
+        'shard_csv': csv_path and shard_csv_path(csv_path, *shard, csv_format),
+        'complete': False,
+    }
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return np.lib.format.open_memmap(masks_file, mode='w+', dtype=np.uint16, shape=tuple(meta['shape']))
+
+def write_shard_chunk(masks, offset, start, stop, chunk_masks):
+    # Like write_chunk, for a shard holding lattice points offset..
+    masks[:, start - offset:stop - offset] = chunk_masks
+
+def finish_shard(path, summary):
+    _, meta_file = store_files(path)
+    with open(meta_file) as f:
+        meta = json.load(f)
+    meta['summary'] = summary_to_json(summary)
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f, indent=2)
+    mark_complete(path)
+
+def load_shards(store_path, count):
+    # Sidecars of all N shards, checked to be finished parts of one sweep
+    shards = []
+    for index in range(count):
+        path = store_path + shard_suffix(index, count)
+        if not os.path.exists(store_files(path)[1]):
+            raise FileNotFoundError(f"Shard {index}/{count} is missing: {store_files(path)[1]}")
+        masks, meta = open_store(path)
+        if not meta['complete']:
+            raise ValueError(f"Shard {index}/{count} has not finished")
+        if shards and meta['config'] != shards[0][1]['config']:
+            raise ValueError(f"Shard {index}/{count} was written by a different sweep: {meta['config']}")
+        if shards and meta['start'] != shards[-1][1]['stop']:
+            raise ValueError(f"Shard {index}/{count} does not continue shard {index - 1}/{count}")
+        shards.append((masks, meta))
+    return shards
+
+def _concatenate(parts, target):
+    with open(target, 'wb') as out:
+        for part in parts:
+            with open(part, 'rb') as f:
+                shutil.copyfileobj(f, out)
+
+def merge_shards(store_path, count, keep_shards=False):
+    # Writes the full store and CSV from the N shards; returns the merged summary
+    shards = load_shards(store_path, count)
+    first = shards[0][1]
+    taus, step = first['taus'], first['step']
+    total = constrained_size(len(grid_axis(step)))
+    if shards[0][1]['start'] != 0 or shards[-1][1]['stop'] != total:
+        raise ValueError(f"Shards cover lattice points {shards[0][1]['start']}..{shards[-1][1]['stop']}, not 0..{total}")
+    store = create_store(store_path, taus, step)
+    summary = None
+    for masks, meta in shards:
+        for start in range(0, len(masks[0]), 1_000_000):
+            stop = min(start + 1_000_000, len(masks[0]))
+            write_chunk(store, meta['start'] + start, meta['start'] + stop, masks[:, start:stop])
+        shard_summary = summary_from_json(meta['summary'])
+        summary = shard_summary if summary is None else merge_summaries(summary, shard_summary)
+    store.flush()
+    mark_complete(store_path)
+
+    # Only shard 0 has a header, and gzip members and zstd frames may follow
+    # each other, so the exports concatenate as they are (file by file for columns)
+    csv_path = first['csv']
+    if csv_path and first['csv_format'] == 'columns':
+        os.makedirs(csv_path, exist_ok=True)
+        shutil.copyfile(os.path.join(first['shard_csv'], 'columns.json'), os.path.join(csv_path, 'columns.json'))
+        for name in COLUMNS:
+            _concatenate([os.path.join(meta['shard_csv'], name) for _, meta in shards], os.path.join(csv_path, name))
+    elif csv_path:
+        _concatenate([meta['shard_csv'] for _, meta in shards], csv_path)
+
+    if not keep_shards:
+        for index, (_, meta) in enumerate(shards):
+            path = store_path + shard_suffix(index, count)
+            for file in store_files(path) + (checkpoint_file(path),):
+                if os.path.exists(file):
+                    os.remove(file)
+            if csv_path and os.path.isdir(meta['shard_csv']):
+                shutil.rmtree(meta['shard_csv'])
+            elif csv_path:
+                os.remove(meta['shard_csv'])
+    return summary, taus, step, csv_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the shards of a sweep run with --shard i/N")
+    parser.add_argument('store', help="Store path of the sweep, e.g. equilibria_tau_0.001_step_0.01")
+    parser.add_argument('shards', type=int, help="Number of shards N")
+    parser.add_argument('--keep-shards', action='store_true', help="Keep the shard files after merging")
+    args = parser.parse_args()
+
+    summary, taus, step, csv_path = merge_shards(args.store, args.shards, args.keep_shards)
+    print_summary(summary, taus, step, bool(summary['mixed'].any()))
+    print(f"Equilibrium bitmask store has been written to '{args.store}.npy'")
+    if csv_path:
+        print(f"Specific equilibria data has been written to '{csv_path}'")
+
+if __name__ == "__main__":
+    main()